@@ -0,0 +1,305 @@
+import logging
+import os
+import sys
+from datetime import datetime
+
+from pymongo.errors import BulkWriteError
+
+from .client import get_async_client
+from .db import (
+    engagements_collection_name, storage_document, timeseries_storage,
+    note_written, recent_averages, rollup_update, rollup_updates, unrolled_documents, written_documents, prepare_engagement,
+    serialize_dates, history_query, history_projection, history_page, decode_history_cursor,
+    HISTORY_SORT, history_stream_sort,
+    daily_pipeline, daily_arrays_result, daily_many_query, DAILY_MANY_PROJECTION,
+    combine_daily_rows, frequency_unit, rollup_covers, series_arrays_pipeline, training_window, window_since,
+    rollup_coverage, rollup_live_update, ROLLUP_STATE_ID,
+    recent_average_pipeline, recent_average_result, recent_averages_pipeline, recent_averages_result,
+    document_counts_pipeline, search_volume_pipeline
+)
+
+# Add parent directory to path to find root config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import settings
+
+logger = logging.getLogger("mcp2")
+
+class AsyncDatabase:
+    """Motor counterpart of Database for use from async routes.
+
+    Methods mirror Database one for one and build the same queries, so the
+    event loop is never blocked on MongoDB round trips. The sync Database is
+    still used by the CLIs, index bootstrap and anything outside the loop.
+    """
+
+    def __init__(self):
+        try:
+            # Shared per-process client; Motor connects lazily, so connect() verifies the server on startup
+            self.client = get_async_client()
+            self.db = self.client.mcp2
+            self.engagements = self.db[engagements_collection_name()]
+            self.daily = self.db.engagements_daily
+            self.rollup_state = self.db.rollup_state
+        except Exception as e:
+            logger.error(f"MongoDB async client error: {str(e)}")
+            raise
+
+    async def connect(self):
+        """Ping the server through the async client."""
+        try:
+            await self.client.admin.command('ping')
+            logger.info("Async MongoDB connection successful")
+        except Exception as e:
+            logger.error(f"Async MongoDB connection error: {str(e)}")
+            raise
+
+    async def store_engagement_data(self, data):
+        """Store engagement data in MongoDB."""
+        try:
+            logger.info(f"Storing engagement data for topic: {data.get('topic')}, platform: {data.get('platform')}")
+
+            prepare_engagement(data)
+
+            # Insert into MongoDB
+            result = await self.engagements.insert_one(storage_document(data))
+
+            # Keep the daily rollup in step with the raw collection
+            if isinstance(data.get('timestamp'), datetime):
+                await self.daily.update_one(*rollup_update(data), upsert=True)
+            note_written([data])
+
+            logger.info(f"Data stored successfully with ID: {result.inserted_id}")
+            return result.inserted_id
+        except Exception as e:
+            logger.error(f"Error storing engagement data: {str(e)}")
+            logger.error(f"Data that failed: {data}")
+            raise
+
+    async def store_engagement_batch(self, documents):
+        """Store many engagement documents with one unordered insert_many and one rollup bulk_write; returns those inserted."""
+        if not documents:
+            return []
+        written = await self.insert_engagements(documents)
+        if await self.apply_rollup(written):
+            logger.error("Stored documents are missing from engagements_daily; rebuild it with python -m app.database.rollup")
+        return written
+
+    async def insert_engagements(self, documents):
+        """Insert engagement documents with one unordered insert_many; returns the documents that were written."""
+        try:
+            for data in documents:
+                prepare_engagement(data)
+
+            error = None
+            try:
+                await self.engagements.insert_many([storage_document(data) for data in documents], ordered=False)
+            except BulkWriteError as e:
+                error = e
+            written = written_documents(documents, error)
+            if len(written) < len(documents):
+                logger.error(f"{len(documents) - len(written)} of {len(documents)} documents failed to insert")
+
+            logger.info(f"Stored batch of {len(written)} engagement documents")
+            return written
+        except Exception as e:
+            logger.error(f"Error storing engagement batch: {str(e)}")
+            raise
+
+    async def apply_rollup(self, documents):
+        """Add stored engagement documents to the engagements_daily rollup; returns the documents whose rows failed."""
+        try:
+            updates = rollup_updates(documents)
+            failed = []
+            if updates:
+                try:
+                    await self.daily.bulk_write(updates, ordered=False)
+                except BulkWriteError as e:
+                    failed = unrolled_documents(documents, e)
+                    logger.error(f"Rollup update failed for {len(failed)} of {len(documents)} documents")
+            failed_ids = {id(data) for data in failed}
+            note_written([data for data in documents if id(data) not in failed_ids])
+            return failed
+        except Exception as e:
+            logger.error(f"Error updating rollup for {len(documents)} documents: {str(e)}")
+            raise
+
+    async def mark_rollup_live(self):
+        """Record in rollup_state that this version keeps engagements_daily current from tomorrow on."""
+        await self.rollup_state.update_one(*rollup_live_update(), upsert=True)
+
+    async def rollup_ready(self, since=None):
+        """Whether engagements_daily holds every day from since on (all days when None)."""
+        if rollup_coverage.expired():
+            rollup_coverage.load(await self.rollup_state.find_one({"_id": ROLLUP_STATE_ID}))
+        return rollup_coverage.covers(since)
+
+    async def get_historical_data(self, topic, platform=None, start=None):
+        """Get historical engagement data for a topic, from start on when given."""
+        try:
+            logger.info(f"Retrieving historical data for topic: {topic}, platform: {platform}")
+
+            cursor = self.engagements.find(
+                history_query(topic, platform, start), history_projection()
+            ).sort("timestamp", 1)
+            results = await cursor.to_list(length=None)
+
+            logger.info(f"Retrieved {len(results)} historical data points")
+            return serialize_dates(results)
+        except Exception as e:
+            logger.error(f"Error retrieving historical data: {str(e)}")
+            raise
+
+    async def get_historical_page(self, topic, platform=None, start=None, end=None, limit=1000, fields=None, cursor=None):
+        """One page of historical data in (timestamp, _id) order; returns (documents, next_cursor)."""
+        try:
+            after = decode_history_cursor(cursor) if cursor else None
+            documents = await self.engagements.find(
+                history_query(topic, platform, start, end, after),
+                history_projection(fields, keep_id=True)
+            ).sort(HISTORY_SORT).limit(limit + 1).to_list(length=None)
+
+            documents, next_cursor = history_page(documents, limit)
+            return serialize_dates(documents), next_cursor
+        except Exception as e:
+            logger.error(f"Error retrieving historical page: {str(e)}")
+            raise
+
+    async def iter_historical_data(self, topic, platform=None, start=None, end=None, fields=None, batch_size=1000,
+                                   limit=None):
+        """Yield historical documents in timestamp order, fetching batch_size at a time from the cursor."""
+        cursor = self.engagements.find(
+            history_query(topic, platform, start, end),
+            history_projection(fields),
+            batch_size=batch_size
+        ).sort(history_stream_sort())
+        if limit:
+            cursor = cursor.limit(limit)
+        async for document in cursor:
+            yield serialize_dates([document])[0]
+
+    async def get_aggregated_daily_data(self, topic, platform=None):
+        """Get daily aggregated engagement data for Prophet from the engagements_daily rollup."""
+        try:
+            logger.info(f"Retrieving aggregated daily data for topic: {topic}, platform: {platform}")
+
+            results = await self.daily.aggregate(daily_pipeline(topic, platform)).to_list(length=None)
+
+            logger.info(f"Retrieved {len(results)} aggregated data points")
+            return results
+        except Exception as e:
+            logger.error(f"Error retrieving aggregated data: {str(e)}")
+            raise
+
+    async def get_daily_series_arrays(self, topic, platform=None):
+        """Columnar get_aggregated_daily_data: the series as DailyArrays, with dates never formatted as strings."""
+        return await self.get_series_arrays(topic, platform, "D", "UTC")
+
+    async def get_series_arrays(self, topic, platform=None, frequency="D", tz=None, periods=None):
+        """The series as DailyArrays bucketed by frequency (H, D, W or M) in timezone tz, limited to its training window."""
+        try:
+            tz = tz or settings.AGGREGATION_TIMEZONE
+            window = training_window(frequency, periods)
+            from_rollup = rollup_covers(frequency_unit(frequency), tz) and await self.rollup_ready(window_since(window))
+            collection = self.daily if from_rollup else self.engagements
+            pipeline = series_arrays_pipeline(topic, platform, frequency, tz, window, raw=not from_rollup)
+            results = await collection.aggregate(pipeline).to_list(length=None)
+            series = daily_arrays_result(results)
+            logger.info(
+                f"Retrieved {len(series)} aggregated data points for topic: {topic}, platform: {platform}, "
+                f"frequency: {frequency}, timezone: {tz}, window: {window}"
+            )
+            return series
+        except Exception as e:
+            logger.error(f"Error retrieving series arrays: {str(e)}")
+            raise
+
+    async def get_aggregated_daily_data_many(self, series, columnar=False, since=None):
+        """Get daily aggregated data for many (topic, platform) pairs with a single $in query on the rollup, from day since on."""
+        try:
+            series = list(dict.fromkeys(series))
+            logger.info(f"Retrieving aggregated daily data for {len(series)} series")
+
+            rows = await self.daily.find(daily_many_query(series, since), DAILY_MANY_PROJECTION).to_list(length=None)
+            results = combine_daily_rows(rows, series, columnar)
+
+            logger.info(f"Retrieved aggregated data for {sum(1 for rows in results.values() if rows)} non-empty series")
+            return results
+        except Exception as e:
+            logger.error(f"Error retrieving aggregated data for many series: {str(e)}")
+            raise
+
+    async def get_recent_platform_average(self, topic, platform, days=7):
+        """Get average engagement for a topic and platform over recent days."""
+        try:
+            topic = topic.lower()  # Normalize topic case
+
+            cached = recent_averages.get(topic, platform, days)
+            if cached is not None:
+                return cached[0]
+
+            # Average on the server; only the total and count come back
+            pipeline = recent_average_pipeline(topic, platform, days)
+            results = await self.engagements.aggregate(pipeline).to_list(length=None)
+            return recent_average_result(topic, platform, days, results)
+        except Exception as e:
+            logger.error(f"Error calculating recent average: {str(e)}")
+            return 0
+
+    async def get_recent_platform_averages(self, topic, platforms, days=7):
+        """Get average engagement over recent days for several platforms of a topic with one aggregation."""
+        try:
+            topic = topic.lower()  # Normalize topic case
+
+            averages = {}
+            missing = []
+            for platform in platforms:
+                cached = recent_averages.get(topic, platform, days)
+                if cached is not None:
+                    averages[platform] = cached[0]
+                else:
+                    missing.append(platform)
+
+            if missing:
+                pipeline = recent_averages_pipeline(topic, missing, days)
+                results = await self.engagements.aggregate(pipeline).to_list(length=None)
+                averages.update(recent_averages_result(topic, missing, days, results))
+            return averages
+        except Exception as e:
+            logger.error(f"Error calculating recent averages: {str(e)}")
+            return {platform: 0 for platform in platforms}
+
+    async def get_data_statistics(self):
+        """Collections, approximate document total, and document counts by topic and by platform (from the rollup)."""
+        try:
+            topics = await self.daily.aggregate(document_counts_pipeline("topic")).to_list(length=None)
+            topics = {row["_id"]: row["count"] for row in topics}
+            platforms = await self.daily.aggregate(document_counts_pipeline("platform")).to_list(length=None)
+            return {
+                "collections": await self.db.list_collection_names(),
+                # Time-series collections are views, which have no metadata count
+                "documents": sum(topics.values()) if timeseries_storage() else await self.engagements.estimated_document_count(),
+                "topics": topics,
+                "platforms": {row["_id"]: row["count"] for row in platforms}
+            }
+        except Exception as e:
+            logger.error(f"Error computing data statistics: {str(e)}")
+            raise
+
+    async def get_search_volume(self, topic, days=30):
+        """Get search volume for a topic over time."""
+        try:
+            topic = topic.lower()  # Normalize topic case
+
+            results = await self.engagements.aggregate(search_volume_pipeline(topic, days)).to_list(length=None)
+
+            # Format results
+            volume_data = [
+                {"date": item["_id"]["date"], "count": item["count"]}
+                for item in results
+            ]
+
+            logger.info(f"Retrieved search volume data for {topic}: {len(volume_data)} days")
+            return volume_data
+        except Exception as e:
+            logger.error(f"Error retrieving search volume: {str(e)}")
+            raise
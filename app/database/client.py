@@ -0,0 +1,89 @@
+"""Process-wide MongoDB clients.
+
+Every Database / AsyncDatabase in a process shares the clients returned here,
+so each instance holds one connection pool per driver instead of one per
+component. Pool size, timeouts, compression and read preference come from
+Settings.
+"""
+import logging
+import os
+import sys
+import threading
+
+from pymongo import MongoClient
+
+# Add parent directory to path to find root config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import settings
+
+logger = logging.getLogger("mcp2.client")
+
+_lock = threading.Lock()
+_client = None
+_async_client = None
+
+
+def client_options():
+    """Keyword arguments shared by the sync and async clients."""
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "readPreference": settings.MONGO_READ_PREFERENCE,
+        "retryWrites": settings.MONGO_RETRY_WRITES,
+        "appname": settings.MONGO_APP_NAME,
+    }
+    # 0 leaves socket reads unbounded, as the driver default does
+    if settings.MONGO_SOCKET_TIMEOUT_MS:
+        options["socketTimeoutMS"] = settings.MONGO_SOCKET_TIMEOUT_MS
+    if settings.MONGO_COMPRESSORS:
+        options["compressors"] = settings.MONGO_COMPRESSORS
+    return options
+
+
+def get_client():
+    """The process-wide PyMongo client, created and verified on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                logger.info(f"Attempting to connect to MongoDB at: {settings.MONGODB_URI}")
+                client = MongoClient(settings.MONGODB_URI, **client_options())
+
+                # Test the connection
+                client.admin.command('ping')
+                if settings.ENGAGEMENTS_STORAGE == "timeseries":
+                    logger.info("MongoDB connection successful")
+                else:
+                    # Collection metadata count: constant time, unlike count_documents({})
+                    doc_count = client.mcp2.engagements.estimated_document_count()
+                    logger.info(f"MongoDB connection successful. Found about {doc_count} documents in engagements collection")
+                _client = client
+    return _client
+
+
+def get_async_client():
+    """The process-wide Motor client; Motor connects lazily, so AsyncDatabase.connect() verifies it."""
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                # Imported here so sync-only tools (CLIs, forecast workers) do not need Motor
+                from motor.motor_asyncio import AsyncIOMotorClient
+                logger.info(f"Creating async MongoDB client for: {settings.MONGODB_URI}")
+                _async_client = AsyncIOMotorClient(settings.MONGODB_URI, **client_options())
+    return _async_client
+
+
+def close_clients():
+    """Close both shared clients; the next get_client()/get_async_client() reconnects."""
+    global _client, _async_client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+        if _async_client is not None:
+            _async_client.close()
+            _async_client = None
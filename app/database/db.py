@@ -1,12 +1,20 @@
 import logging
-from pymongo import MongoClient
-from datetime import datetime, timedelta
+import numpy as np
+from bson import ObjectId, json_util
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from datetime import datetime, timedelta, timezone
 import sys
 import os
+import threading
+import time
+import base64
+from collections import OrderedDict, namedtuple
 
 # Add parent directory to path to find root config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from config import settings
+from .client import get_client
 
 # Configure logging
 logging.basicConfig(
@@ -19,26 +27,709 @@ logging.basicConfig(
 )
 logger = logging.getLogger("mcp2")
 
+class SeriesVersions:
+    """Per-process data version for each (topic, platform) series.
+    
+    Every write bumps the version of its (topic, platform) series and of the
+    topic as a whole (platform None), so anything derived from a series can
+    check whether new data arrived since it was computed.
+    """
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def bump(self, topic, platform=None):
+        with self._lock:
+            for key in {(topic, platform or None), (topic, None)}:
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+    def get(self, topic, platform=None):
+        return self._versions.get((topic, platform or None), 0)
+
+def naive_utc(timestamp):
+    """A datetime as naive UTC, the way MongoDB returns it."""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+class RecentAverages:
+    """Rolling cache of recent average engagement per (topic, platform) and window length.
+    
+    An entry holds the (total, count) of the window as computed by the
+    database and every stored document whose timestamp falls inside the window
+    is added to it, so reads stay current without another query. Entries are
+    recomputed after ttl_seconds so points that age out of the window drop out.
+    """
+    def __init__(self, ttl_seconds=None, max_items=None):
+        self.ttl_seconds = settings.RECENT_AVERAGE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_items = settings.RECENT_AVERAGE_MAX_ITEMS if max_items is None else max_items
+        # (topic, platform) -> {days: [total, count, seeded_at]}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, topic, platform, days):
+        """(average, count) for the window, or None when it is not cached or has expired."""
+        with self._lock:
+            entry = self._entries.get((topic, platform), {}).get(days)
+            if entry is None or time.time() - entry[2] > self.ttl_seconds:
+                return None
+            total, count, _ = entry
+            return (total / count if count else 0), count
+
+    def seed(self, topic, platform, days, total, count):
+        if not self.max_items:
+            return
+        with self._lock:
+            self._entries.setdefault((topic, platform), {})[days] = [total, count, time.time()]
+            self._entries.move_to_end((topic, platform))
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def add(self, topic, platform, timestamp, value):
+        if not isinstance(timestamp, datetime):
+            return
+        with self._lock:
+            windows = self._entries.get((topic, platform))
+            if not windows:
+                return
+            age = datetime.utcnow() - naive_utc(timestamp)
+            for days, entry in windows.items():
+                if age <= timedelta(days=days):
+                    entry[0] += value or 0
+                    entry[1] += 1
+
+# Shared by every Database instance in this process
+series_versions = SeriesVersions()
+recent_averages = RecentAverages()
+
+def note_written(documents):
+    """Bookkeeping after documents were stored: bump series versions and update cached recent averages."""
+    for topic, platform in {(data.get('topic'), data.get('platform')) for data in documents}:
+        series_versions.bump(topic, platform)
+    for data in documents:
+        recent_averages.add(data.get('topic'), data.get('platform'), data.get('timestamp'), data.get('value'))
+
+def day_bucket(timestamp):
+    """UTC midnight (naive, as stored by MongoDB) of the day a timestamp falls on."""
+    timestamp = naive_utc(timestamp)
+    return datetime(timestamp.year, timestamp.month, timestamp.day)
+
+def rollup_update(data):
+    """(filter, update) that adds one engagement document to its engagements_daily rollup row."""
+    return (
+        {"topic": data.get('topic'), "platform": data.get('platform'), "day": day_bucket(data['timestamp'])},
+        {"$inc": {"y": data.get('value') or 0, "count": 1}}
+    )
+
+def rollup_key(data):
+    """(topic, platform, day) of the rollup row an engagement document adds to."""
+    return data.get('topic'), data.get('platform'), day_bucket(data['timestamp'])
+
+def rollup_updates(documents):
+    """Upserts adding many engagement documents to engagements_daily, one per (topic, platform, day)."""
+    totals = {}
+    for data in documents:
+        if not isinstance(data.get('timestamp'), datetime):
+            continue
+        total = totals.setdefault(rollup_key(data), [0, 0])
+        total[0] += data.get('value') or 0
+        total[1] += 1
+    return [
+        UpdateOne(
+            {"topic": topic, "platform": platform, "day": day},
+            {"$inc": {"y": y, "count": count}},
+            upsert=True
+        )
+        for (topic, platform, day), (y, count) in totals.items()
+    ]
+
+def unrolled_documents(documents, error):
+    """The documents whose rows failed in an unordered bulk_write of rollup_updates(documents).
+
+    The other upserts were applied despite the BulkWriteError, so only these
+    documents may be added again.
+    """
+    keys = list(dict.fromkeys(
+        rollup_key(data) for data in documents if isinstance(data.get('timestamp'), datetime)
+    ))
+    failed = {keys[write_error["index"]] for write_error in error.details.get("writeErrors", [])}
+    return [
+        data for data in documents
+        if isinstance(data.get('timestamp'), datetime) and rollup_key(data) in failed
+    ]
+
+# _id of the rollup_state document describing engagements_daily
+ROLLUP_STATE_ID = "engagements_daily"
+
+def rollup_live_update():
+    """(filter, update) recording that live writes keep engagements_daily current from tomorrow (UTC) on.
+
+    Today may already have had writes from a version without the rollup, so
+    the first complete live day is tomorrow. The earliest recorded day is kept.
+    """
+    return (
+        {"_id": ROLLUP_STATE_ID},
+        {"$min": {"live_since": day_bucket(datetime.utcnow()) + timedelta(days=1)}}
+    )
+
+class RollupCoverage:
+    """Per-process copy of the rollup_state document, telling which days engagements_daily holds in full.
+
+    Days from live_since on are kept current by live writes, and days before
+    backfilled_through were recomputed from the raw engagements by a rebuild
+    (see app.database.rollup). Once backfilled_through reaches live_since the
+    rollup holds every day and stays that way; until then the state is
+    re-read every ttl_seconds and reads that need older days use the raw
+    engagements.
+    """
+    def __init__(self, ttl_seconds=None):
+        self.ttl_seconds = settings.ROLLUP_STATE_REFRESH_SECONDS if ttl_seconds is None else ttl_seconds
+        self._state = None
+        self._loaded_at = None
+
+    def expired(self):
+        if self._loaded_at is None:
+            return True
+        return not self.complete() and time.time() - self._loaded_at > self.ttl_seconds
+
+    def load(self, state):
+        self._state = state or {}
+        self._loaded_at = time.time()
+
+    def complete(self):
+        state = self._state or {}
+        live_since, backfilled_through = state.get("live_since"), state.get("backfilled_through")
+        return live_since is not None and backfilled_through is not None and backfilled_through >= live_since
+
+    def covers(self, since=None):
+        """Whether every day from since on (all days when None) is complete in the rollup."""
+        if self.complete():
+            return True
+        live_since = (self._state or {}).get("live_since")
+        return live_since is not None and since is not None and naive_utc(since) >= live_since
+
+# Shared by every Database and AsyncDatabase in this process
+rollup_coverage = RollupCoverage()
+
+# Duplicate key error code
+DUPLICATE_KEY = 11000
+
+def written_documents(documents, error=None):
+    """The documents an unordered insert_many actually wrote, given its BulkWriteError (if any).
+
+    _id is assigned in prepare_engagement, so a duplicate key error means an
+    earlier attempt at the same batch already stored the document; it counts
+    as written so its rollup increment is still applied. Time-series
+    collections have no unique _id index, so there a second attempt stores
+    the document again instead.
+    """
+    if error is None:
+        return documents
+    failed = {
+        write_error["index"] for write_error in error.details.get("writeErrors", [])
+        if write_error.get("code") != DUPLICATE_KEY
+    }
+    return [data for index, data in enumerate(documents) if index not in failed]
+
+# Storage layout of raw engagements. In "timeseries" mode they live in a MongoDB
+# time-series collection with topic and platform moved under the metaField "meta";
+# queries and projections are translated so callers always see the flat layout.
+META_FIELDS = ("topic", "platform")
+
+def timeseries_storage():
+    return settings.ENGAGEMENTS_STORAGE == "timeseries"
+
+def engagements_collection_name():
+    return settings.TIMESERIES_COLLECTION if timeseries_storage() else "engagements"
+
+def engagement_field(name):
+    """Path of a flat engagement field in the configured storage layout."""
+    if timeseries_storage() and name in META_FIELDS:
+        return f"meta.{name}"
+    return name
+
+def storage_document(data):
+    """The document to insert for a flat engagement document."""
+    if not timeseries_storage():
+        return data
+    document = {key: value for key, value in data.items() if key not in META_FIELDS}
+    document["meta"] = {field: data.get(field) for field in META_FIELDS}
+    return document
+
+def engagement_projection(fields):
+    """Find projection returning the given flat fields (without _id) from either layout."""
+    projection = {"_id": 0}
+    for field in fields:
+        projection[field] = f"${engagement_field(field)}" if field in META_FIELDS and timeseries_storage() else 1
+    return projection
+
+# Query builders shared by Database and AsyncDatabase
+
+def prepare_engagement(data):
+    """Normalize an engagement document in place before it is inserted."""
+    # Convert float values to proper numeric types
+    if 'value' in data:
+        # Ensure value is never exactly zero for platforms with actual data
+        platform = data.get('platform', '')
+        if data['value'] == 0 and platform in ['news', 'twitter', 'reddit'] and data.get('metadata', {}).get('result_count', 0) > 0:
+            logger.warning(f"Detected zero value for platform {platform} with data. Setting minimum value.")
+            data['value'] = 0.1
+    
+    # Ensure timestamp is a datetime object
+    if isinstance(data.get('timestamp'), str):
+        data['timestamp'] = datetime.fromisoformat(data['timestamp'].replace('Z', '+00:00'))
+    
+    # Add created_at field
+    data['created_at'] = datetime.utcnow()
+    # Fixed before the first insert attempt so the unique _id index stops a retried batch from storing a
+    # document twice (time-series collections have no such index, so their batches are not retried)
+    data.setdefault('_id', ObjectId())
+    return data
+
+def historical_query(topic, platform=None):
+    query = {engagement_field("topic"): topic}
+    if platform:
+        query[engagement_field("platform")] = platform
+    return query
+
+def serialize_dates(results):
+    """Convert datetime objects to ISO format strings for JSON serialization."""
+    for result in results:
+        if isinstance(result.get('timestamp'), datetime):
+            result['timestamp'] = result['timestamp'].isoformat()
+        if isinstance(result.get('created_at'), datetime):
+            result['created_at'] = result['created_at'].isoformat()
+    return results
+
+def combine_daily_arrays(rows, series):
+    """combine_daily_rows keyed on the native day, building DailyArrays without date strings."""
+    by_platform = {}
+    by_topic = {}
+    for row in rows:
+        for totals in (
+            by_platform.setdefault((row["topic"], row.get("platform")), {}),
+            by_topic.setdefault(row["topic"], {})
+        ):
+            day = totals.setdefault(row["day"], [0, 0])
+            day[0] += row["y"]
+            day[1] += row["count"]
+
+    results = {}
+    for topic, platform in series:
+        totals = by_topic.get(topic, {}) if platform is None else by_platform.get((topic, platform), {})
+        days = sorted(totals)
+        results[(topic, platform)] = DailyArrays.from_lists(
+            days, [totals[day][0] for day in days], [totals[day][1] for day in days]
+        )
+    return results
+
+# Fields /topics/{topic}/history may project; timestamp is always returned because pages are keyed on it
+HISTORY_FIELDS = ("topic", "platform", "timestamp", "value", "metadata", "created_at")
+
+# History order; _id breaks timestamp ties so every query sees the same order
+HISTORY_SORT = [("timestamp", 1), ("_id", 1)]
+
+def history_stream_sort():
+    """Order of streamed history, which needs no page cursor.
+
+    Time-series collections cannot index _id, so there the stream is only
+    ordered by timestamp, which their bucket index can serve, instead of
+    sorting every matching point on (timestamp, _id) in memory.
+    """
+    return [("timestamp", 1)] if timeseries_storage() else HISTORY_SORT
+
+def history_projection(fields=None, keep_id=False):
+    """Projection of history documents; keep_id also returns _id, which pages need for their cursor."""
+    if not fields:
+        if not timeseries_storage():
+            return None if keep_id else {"_id": 0}
+        fields = HISTORY_FIELDS
+    unknown = set(fields) - set(HISTORY_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Available: {', '.join(HISTORY_FIELDS)}")
+    projection = engagement_projection(list(dict.fromkeys(list(fields) + ["timestamp"])))
+    if keep_id:
+        projection["_id"] = 1
+    return projection
+
+def encode_history_cursor(timestamp, last_id):
+    """Opaque page token: the (timestamp, _id) of the last document returned."""
+    raw = json_util.dumps({"ts": timestamp, "id": last_id})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_history_cursor(cursor):
+    try:
+        raw = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return naive_utc(raw["ts"]), raw["id"]
+    except Exception:
+        raise ValueError("Invalid history cursor")
+
+def history_query(topic, platform=None, start=None, end=None, after=None):
+    """historical_query restricted to [start, end) and to documents after a (timestamp, _id) page cursor."""
+    query = historical_query(topic, platform)
+    timestamp = {}
+    if start is not None:
+        timestamp["$gte"] = naive_utc(start)
+    if after is not None:
+        after_timestamp, after_id = after
+        timestamp["$gte"] = max(after_timestamp, timestamp.get("$gte", after_timestamp))
+        query["$or"] = [
+            {"timestamp": {"$gt": after_timestamp}},
+            {"timestamp": after_timestamp, "_id": {"$gt": after_id}}
+        ]
+    if end is not None:
+        timestamp["$lt"] = naive_utc(end)
+    if timestamp:
+        query["timestamp"] = timestamp
+    return query
+
+def history_page(documents, limit):
+    """Trim a limit + 1 fetch to one page, build the cursor for the next one (None on the last page) and drop _id."""
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_history_cursor(documents[-1]["timestamp"], documents[-1]["_id"])
+    for document in documents:
+        document.pop("_id", None)
+    return documents, next_cursor
+
+def daily_pipeline(topic, platform=None):
+    """Rollup aggregation returning {"ds", "y", "count"} rows for one series, oldest first."""
+    # Build match stage
+    match_stage = {"topic": topic}
+    if platform:
+        match_stage["platform"] = platform
+        
+    # Rows are already daily, so only platforms need combining
+    return [
+        {"$match": match_stage},
+        {"$group": {
+            "_id": "$day",
+            "y": {"$sum": "$y"},
+            "count": {"$sum": "$count"}
+        }},
+        {"$sort": {"_id": 1}},
+        {"$project": {
+            "_id": 0,
+            "ds": {"$dateToString": {"format": "%Y-%m-%d", "date": "$_id"}},
+            "y": 1,
+            "count": 1
+        }}
+    ]
+
+class DailyArrays:
+    """A series as parallel NumPy arrays: ds (datetime64[ns] bucket start), y (float64) and count (int64).
+
+    Buckets are days unless the series was loaded for another frequency.
+    """
+    def __init__(self, ds, y, count):
+        self.ds = ds
+        self.y = y
+        self.count = count
+
+    def __len__(self):
+        return len(self.ds)
+
+    @classmethod
+    def from_lists(cls, ds=(), y=(), count=()):
+        return cls(
+            np.array(ds, dtype='datetime64[ns]'),
+            np.array(y, dtype=np.float64),
+            np.array(count, dtype=np.int64)
+        )
+
+def daily_arrays_pipeline(topic, platform=None):
+    """daily_pipeline that keeps native dates and $pushes the days into one document of parallel arrays."""
+    return daily_pipeline(topic, platform)[:3] + [
+        {"$group": {
+            "_id": None,
+            "ds": {"$push": "$_id"},
+            "y": {"$push": "$y"},
+            "count": {"$push": "$count"}
+        }}
+    ]
+
+def daily_arrays_result(results):
+    if not results:
+        return DailyArrays.from_lists()
+    return DailyArrays.from_lists(results[0]["ds"], results[0]["y"], results[0]["count"])
+
+# $dateTrunc bin unit for each forecast frequency
+FREQUENCY_UNITS = {"H": "hour", "D": "day", "W": "week", "M": "month", "MS": "month"}
+
+def frequency_unit(frequency):
+    unit = FREQUENCY_UNITS.get((frequency or "D").upper())
+    if unit is None:
+        raise ValueError(f"Unsupported frequency: {frequency}. Available: {', '.join(FREQUENCY_UNITS)}")
+    return unit
+
+def is_utc(tz):
+    return tz is None or tz.upper() in ("UTC", "ETC/UTC", "Z", "+00:00")
+
+def rollup_covers(unit, tz=None):
+    """Whether buckets of unit in tz can be built from engagements_daily, whose days are UTC days."""
+    return unit != "hour" and is_utc(tz)
+
+def bucket_expression(date, unit, tz=None):
+    """Start of the unit bucket that date falls in, as naive local time in tz (UTC stays as stored)."""
+    trunc = {"date": date, "unit": unit}
+    if unit == "week":
+        # Sunday-start weeks line up with the Sundays pandas' "W" frequency forecasts
+        trunc["startOfWeek"] = "sunday"
+    if is_utc(tz):
+        return {"$dateTrunc": trunc}
+    trunc["timezone"] = tz
+    # Rebuild the bucket start from its local date parts so ds reads as local wall-clock time
+    local = {"date": {"$dateTrunc": trunc}, "timezone": tz}
+    return {"$dateFromParts": {
+        "year": {"$year": local},
+        "month": {"$month": local},
+        "day": {"$dayOfMonth": local},
+        "hour": {"$hour": local}
+    }}
+
+# Coarsest last; a downsampling unit has to come after the series' own unit
+BUCKET_UNITS = ("hour", "day", "week", "month")
+# Days spanned by one period of each unit, for sizing the automatic training window
+UNIT_DAYS = {"hour": 1 / 24, "day": 1, "week": 7, "month": 31}
+
+# start: naive UTC datetime the window begins at. downsample_unit: None to drop
+# everything before start, or the unit older buckets are averaged into.
+TrainingWindow = namedtuple("TrainingWindow", ["start", "downsample_unit"])
+
+def window_start(days, unit="day"):
+    """Start of a window over the last days, moved back to the start of its week (Sunday) or, for months, month.
+
+    The first bucket is then never partial, and the start only changes once a
+    week (or month), so refits in between see the same history start and can
+    be warm-started.
+    """
+    start = day_bucket(datetime.utcnow() - timedelta(days=days))
+    if unit == "month":
+        return start.replace(day=1)
+    return start - timedelta(days=(start.weekday() + 1) % 7)
+
+def training_window(frequency="D", periods=None):
+    """The TrainingWindow TRAINING_WINDOW applies to a forecast of periods at frequency, or None for all history.
+
+    "days" keeps the last TRAINING_WINDOW_DAYS. "auto" keeps
+    TRAINING_WINDOW_HORIZON_MULTIPLIER times the forecast horizon, and at
+    least TRAINING_WINDOW_MIN_DAYS. "downsample" keeps the last
+    TRAINING_WINDOW_DAYS at full resolution and averages older buckets into
+    TRAINING_DOWNSAMPLE_FREQUENCY buckets.
+    """
+    policy = settings.TRAINING_WINDOW
+    unit = frequency_unit(frequency)
+    if policy == "all":
+        return None
+    if policy == "days":
+        return TrainingWindow(window_start(settings.TRAINING_WINDOW_DAYS, unit), None)
+    if policy == "auto":
+        horizon_days = (periods or 7) * UNIT_DAYS[unit]
+        days = max(settings.TRAINING_WINDOW_MIN_DAYS, horizon_days * settings.TRAINING_WINDOW_HORIZON_MULTIPLIER)
+        return TrainingWindow(window_start(days, unit), None)
+    if policy == "downsample":
+        coarse = frequency_unit(settings.TRAINING_DOWNSAMPLE_FREQUENCY)
+        if BUCKET_UNITS.index(coarse) <= BUCKET_UNITS.index(unit):
+            # Already as coarse as the downsampling unit, so all history is kept as is
+            return None
+        return TrainingWindow(window_start(settings.TRAINING_WINDOW_DAYS, coarse), coarse)
+    raise ValueError(f"Unknown TRAINING_WINDOW: {policy}. Available: all, days, auto, downsample")
+
+def window_since(window):
+    """Earliest bucket a series query reads for a TrainingWindow, or None when it reads all history."""
+    return window.start if window is not None and window.downsample_unit is None else None
+
+def series_arrays_pipeline(topic, platform=None, frequency="D", tz=None, window=None, raw=False):
+    """daily_arrays_pipeline with buckets following frequency (H, D, W or M) in timezone tz.
+
+    Run it on engagements_daily when rollup_covers(unit, tz), otherwise on the
+    raw engagements collection (or always, with raw=True), where every document counts once. A
+    TrainingWindow either drops data before its start in the $match, or
+    averages the buckets before it into downsample_unit buckets, so y keeps the
+    scale of a single bucket.
+    """
+    unit = frequency_unit(frequency)
+    if unit == "day" and is_utc(tz) and window is None and not raw:
+        return daily_arrays_pipeline(topic, platform)
+    since = window_since(window)
+
+    if rollup_covers(unit, tz) and not raw:
+        match_stage = {"topic": topic}
+        if platform:
+            match_stage["platform"] = platform
+        if since is not None:
+            match_stage["day"] = {"$gte": since}
+        bucket = "$day" if unit == "day" else bucket_expression("$day", unit, tz)
+        y, count = "$y", "$count"
+    else:
+        match_stage = historical_query(topic, platform)
+        match_stage["timestamp"] = {"$type": "date"}
+        if since is not None:
+            match_stage["timestamp"]["$gte"] = since
+        bucket, y, count = bucket_expression("$timestamp", unit, tz), {"$ifNull": ["$value", 0]}, 1
+
+    pipeline = [
+        {"$match": match_stage},
+        {"$group": {
+            "_id": bucket,
+            "y": {"$sum": y},
+            "count": {"$sum": count}
+        }}
+    ]
+    if window is not None and window.downsample_unit is not None:
+        # Bucket starts are already local wall-clock time, so truncate them without a timezone
+        pipeline.append({"$group": {
+            "_id": {"$cond": [
+                {"$lt": ["$_id", window.start]},
+                bucket_expression("$_id", window.downsample_unit),
+                "$_id"
+            ]},
+            "y": {"$avg": "$y"},
+            "count": {"$sum": "$count"}
+        }})
+    return pipeline + [
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": None,
+            "ds": {"$push": "$_id"},
+            "y": {"$push": "$y"},
+            "count": {"$push": "$count"}
+        }}
+    ]
+
+def daily_many_query(series, since=None):
+    """Single $in filter on the rollup covering every (topic, platform) pair in series, from day since on."""
+    topics = sorted({topic for topic, _ in series})
+    match_stage = {"topic": {"$in": topics}}
+    if since is not None:
+        match_stage["day"] = {"$gte": since}
+    # Only restrict platforms when no pair asks for all platforms of a topic
+    platforms = {platform for _, platform in series}
+    if None not in platforms:
+        match_stage["platform"] = {"$in": sorted(platforms)}
+    return match_stage
+
+DAILY_MANY_PROJECTION = {"_id": 0, "topic": 1, "platform": 1, "day": 1, "y": 1, "count": 1}
+
+def combine_daily_rows(rows, series, columnar=False):
+    """Group rollup rows into per-series daily lists (or DailyArrays); platform None sums all platforms of the topic."""
+    if columnar:
+        return combine_daily_arrays(rows, series)
+
+    # Daily totals per (topic, platform) and per topic across platforms
+    by_platform = {}
+    by_topic = {}
+    for row in rows:
+        date = row["day"].strftime('%Y-%m-%d')
+        for totals in (
+            by_platform.setdefault((row["topic"], row.get("platform")), {}),
+            by_topic.setdefault(row["topic"], {})
+        ):
+            day = totals.setdefault(date, {"ds": date, "y": 0, "count": 0})
+            day["y"] += row["y"]
+            day["count"] += row["count"]
+
+    results = {}
+    for topic, platform in series:
+        totals = by_topic.get(topic, {}) if platform is None else by_platform.get((topic, platform), {})
+        results[(topic, platform)] = [totals[date] for date in sorted(totals)]
+    return results
+
+def recent_average_pipeline(topic, platform, days=7):
+    """Server-side total and count of value over the last days; missing values count as 0."""
+    cutoff_date = datetime.utcnow() - timedelta(days=days)
+    return [
+        {"$match": {
+            engagement_field("topic"): topic,
+            engagement_field("platform"): platform,
+            "timestamp": {"$gte": cutoff_date}
+        }},
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": {"$ifNull": ["$value", 0]}},
+            "count": {"$sum": 1}
+        }}
+    ]
+
+def recent_average_result(topic, platform, days, results):
+    """Seed the rolling cache from a recent_average_pipeline result and return the average."""
+    total, count = (results[0]["total"], results[0]["count"]) if results else (0, 0)
+    recent_averages.seed(topic, platform, days, total, count)
+    if not count:
+        logger.info(f"No recent data for {topic}/{platform}")
+        return 0
+    avg = total / count
+    logger.info(f"Average engagement for {topic}/{platform}: {avg} (from {count} records)")
+    return avg
+
+def recent_averages_pipeline(topic, platforms, days=7):
+    """recent_average_pipeline for several platforms of a topic at once, grouped by platform."""
+    cutoff_date = datetime.utcnow() - timedelta(days=days)
+    return [
+        {"$match": {
+            engagement_field("topic"): topic,
+            engagement_field("platform"): {"$in": list(platforms)},
+            "timestamp": {"$gte": cutoff_date}
+        }},
+        {"$group": {
+            "_id": f"${engagement_field('platform')}",
+            "total": {"$sum": {"$ifNull": ["$value", 0]}},
+            "count": {"$sum": 1}
+        }}
+    ]
+
+def recent_averages_result(topic, platforms, days, results):
+    """Seed the rolling cache from a recent_averages_pipeline result and return {platform: average}."""
+    by_platform = {row["_id"]: (row["total"], row["count"]) for row in results}
+    averages = {}
+    for platform in platforms:
+        total, count = by_platform.get(platform, (0, 0))
+        recent_averages.seed(topic, platform, days, total, count)
+        averages[platform] = total / count if count else 0
+    logger.info(f"Average engagement for {topic} across {len(averages)} platforms: {averages}")
+    return averages
+
+def document_counts_pipeline(field):
+    """Raw document counts per value of field (topic or platform), read from the daily rollup."""
+    return [
+        {"$group": {"_id": f"${field}", "count": {"$sum": "$count"}}},
+        {"$sort": {"count": -1}}
+    ]
+
+def search_volume_pipeline(topic, days=30):
+    cutoff_date = datetime.utcnow() - timedelta(days=days)
+    return [
+        {"$match": {
+            engagement_field("topic"): topic,
+            engagement_field("platform"): "search_volume",
+            "timestamp": {"$gte": cutoff_date}
+        }},
+        {"$group": {
+            "_id": {
+                "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}
+            },
+            "count": {"$sum": "$value"}
+        }},
+        {"$sort": {"_id.date": 1}}
+    ]
+
 class Database:
     def __init__(self):
         try:
-            logger.info(f"Attempting to connect to MongoDB at: {settings.MONGODB_URI}")
-            
-            self.client = MongoClient(settings.MONGODB_URI)
+            # One pooled client per process, shared by every Database
+            self.client = get_client()
             
             # Explicitly use the existing database
             self.db = self.client.mcp2  # Use existing database
-            self.engagements = self.db.engagements  # Use existing collection
+            self.engagements = self.db[engagements_collection_name()]  # Use existing collection
+            # Daily (topic, platform, day) totals maintained on every write
+            self.daily = self.db.engagements_daily
+            # Which days of engagements_daily are complete (see RollupCoverage)
+            self.rollup_state = self.db.rollup_state
             
             # Log database and collection names
-            logger.info(f"Using database: mcp2 and collection: engagements")
-            
-            # Test the connection
-            self.client.admin.command('ping')
-            
-            # Count documents to verify connection to the collection
-            doc_count = self.engagements.count_documents({})
-            logger.info(f"MongoDB connection successful. Found {doc_count} documents in engagements collection")
+            logger.info(f"Using database: mcp2 and collection: {self.engagements.name} ({settings.ENGAGEMENTS_STORAGE} storage)")
         except Exception as e:
             logger.error(f"MongoDB connection error: {str(e)}")
             raise
@@ -48,26 +739,18 @@ class Database:
         try:
             logger.info(f"Storing engagement data for topic: {data.get('topic')}, platform: {data.get('platform')}")
             
-            # Convert float values to proper numeric types
-            if 'value' in data:
-                # Ensure value is never exactly zero for platforms with actual data
-                platform = data.get('platform', '')
-                if data['value'] == 0 and platform in ['news', 'twitter', 'reddit'] and data.get('metadata', {}).get('result_count', 0) > 0:
-                    logger.warning(f"Detected zero value for platform {platform} with data. Setting minimum value.")
-                    data['value'] = 0.1
-            
-            # Ensure timestamp is a datetime object
-            if isinstance(data.get('timestamp'), str):
-                data['timestamp'] = datetime.fromisoformat(data['timestamp'].replace('Z', '+00:00'))
-            
-            # Add created_at field
-            data['created_at'] = datetime.utcnow()
+            prepare_engagement(data)
             
             # Log the entire data object for debugging
             logger.info(f"Full data being stored: {str(data)}")
             
             # Insert into MongoDB
-            result = self.engagements.insert_one(data)
+            result = self.engagements.insert_one(storage_document(data))
+            
+            # Keep the daily rollup in step with the raw collection
+            if isinstance(data.get('timestamp'), datetime):
+                self.daily.update_one(*rollup_update(data), upsert=True)
+            note_written([data])
             
             logger.info(f"Data stored successfully with ID: {result.inserted_id}")
             return result.inserted_id
@@ -76,65 +759,134 @@ class Database:
             logger.error(f"Data that failed: {data}")
             raise
 
-    def get_historical_data(self, topic, platform=None):
-        """Get historical engagement data for a topic."""
+    def store_engagement_batch(self, documents):
+        """Store many engagement documents with one unordered insert_many and one rollup bulk_write.
+        
+        Documents that fail to insert are logged and skipped; the rest are
+        written. Returns the documents that were inserted.
+        """
+        if not documents:
+            return []
+        written = self.insert_engagements(documents)
+        if self.apply_rollup(written):
+            logger.error("Stored documents are missing from engagements_daily; rebuild it with python -m app.database.rollup")
+        return written
+
+    def insert_engagements(self, documents):
+        """Insert engagement documents with one unordered insert_many; returns the documents that were written.
+        
+        The rollup is not updated: pass the result to apply_rollup. Calling this
+        again with the same documents after an error does not store them twice,
+        except in a time-series collection, which has no unique _id index.
+        """
+        try:
+            for data in documents:
+                prepare_engagement(data)
+            
+            error = None
+            try:
+                self.engagements.insert_many([storage_document(data) for data in documents], ordered=False)
+            except BulkWriteError as e:
+                error = e
+            written = written_documents(documents, error)
+            if len(written) < len(documents):
+                logger.error(f"{len(documents) - len(written)} of {len(documents)} documents failed to insert")
+            
+            logger.info(f"Stored batch of {len(written)} engagement documents")
+            return written
+        except Exception as e:
+            logger.error(f"Error storing engagement batch: {str(e)}")
+            raise
+
+    def apply_rollup(self, documents):
+        """Add stored engagement documents to the engagements_daily rollup with one bulk_write.
+        
+        Returns the documents whose rollup rows failed to update (see
+        unrolled_documents); only those may be passed in again. Any other
+        error leaves it unknown which rows were updated and is raised.
+        """
+        try:
+            updates = rollup_updates(documents)
+            failed = []
+            if updates:
+                try:
+                    self.daily.bulk_write(updates, ordered=False)
+                except BulkWriteError as e:
+                    failed = unrolled_documents(documents, e)
+                    logger.error(f"Rollup update failed for {len(failed)} of {len(documents)} documents")
+            failed_ids = {id(data) for data in failed}
+            note_written([data for data in documents if id(data) not in failed_ids])
+            return failed
+        except Exception as e:
+            logger.error(f"Error updating rollup for {len(documents)} documents: {str(e)}")
+            raise
+
+    def mark_rollup_live(self):
+        """Record in rollup_state that this version keeps engagements_daily current from tomorrow on."""
+        self.rollup_state.update_one(*rollup_live_update(), upsert=True)
+
+    def rollup_ready(self, since=None):
+        """Whether engagements_daily holds every day from since on (all days when None)."""
+        if rollup_coverage.expired():
+            rollup_coverage.load(self.rollup_state.find_one({"_id": ROLLUP_STATE_ID}))
+        return rollup_coverage.covers(since)
+
+    def get_historical_data(self, topic, platform=None, start=None):
+        """Get historical engagement data for a topic, from start on when given."""
         try:
             logger.info(f"Retrieving historical data for topic: {topic}, platform: {platform}")
             
-            # Build query
-            query = {"topic": topic}
-            if platform:
-                query["platform"] = platform
-                
             # Execute query and convert to list
             results = list(self.engagements.find(
-                query, 
-                {"_id": 0}
+                history_query(topic, platform, start), 
+                history_projection()
             ).sort("timestamp", 1))
             
             logger.info(f"Retrieved {len(results)} historical data points")
             
-            # Convert datetime objects to ISO format strings for JSON serialization
-            for result in results:
-                if isinstance(result.get('timestamp'), datetime):
-                    result['timestamp'] = result['timestamp'].isoformat()
-                if isinstance(result.get('created_at'), datetime):
-                    result['created_at'] = result['created_at'].isoformat()
-                    
-            return results
+            return serialize_dates(results)
         except Exception as e:
             logger.error(f"Error retrieving historical data: {str(e)}")
             raise
 
+    def get_historical_page(self, topic, platform=None, start=None, end=None, limit=1000, fields=None, cursor=None):
+        """One page of historical data in (timestamp, _id) order, keyed on the last (timestamp, _id).
+        
+        Returns (documents, next_cursor); pass next_cursor back to get the
+        following page, which is None after the last one.
+        """
+        try:
+            after = decode_history_cursor(cursor) if cursor else None
+            documents = list(self.engagements.find(
+                history_query(topic, platform, start, end, after),
+                history_projection(fields, keep_id=True)
+            ).sort(HISTORY_SORT).limit(limit + 1))
+            
+            documents, next_cursor = history_page(documents, limit)
+            return serialize_dates(documents), next_cursor
+        except Exception as e:
+            logger.error(f"Error retrieving historical page: {str(e)}")
+            raise
+
+    def iter_historical_data(self, topic, platform=None, start=None, end=None, fields=None, batch_size=1000, limit=None):
+        """Yield historical documents in timestamp order, fetching batch_size at a time from the cursor."""
+        cursor = self.engagements.find(
+            history_query(topic, platform, start, end),
+            history_projection(fields),
+            batch_size=batch_size
+        ).sort(history_stream_sort())
+        if limit:
+            cursor = cursor.limit(limit)
+        for document in cursor:
+            yield serialize_dates([document])[0]
+
     def get_aggregated_daily_data(self, topic, platform=None):
-        """Get daily aggregated engagement data for Prophet."""
+        """Get daily aggregated engagement data for Prophet from the engagements_daily rollup."""
         try:
             logger.info(f"Retrieving aggregated daily data for topic: {topic}, platform: {platform}")
             
-            # Build match stage
-            match_stage = {"topic": topic}
-            if platform:
-                match_stage["platform"] = platform
-                
-            # Build pipeline
-            pipeline = [
-                {"$match": match_stage},
-                {"$group": {
-                    "_id": {
-                        "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}
-                    },
-                    "y": {"$sum": "$value"}
-                }},
-                {"$sort": {"_id.date": 1}},
-                {"$project": {
-                    "_id": 0,
-                    "ds": "$_id.date",
-                    "y": 1
-                }}
-            ]
-            
             # Execute aggregation
-            results = list(self.engagements.aggregate(pipeline))
+            results = list(self.daily.aggregate(daily_pipeline(topic, platform)))
             
             logger.info(f"Retrieved {len(results)} aggregated data points")
             return results
@@ -142,60 +894,126 @@ class Database:
             logger.error(f"Error retrieving aggregated data: {str(e)}")
             raise 
 
+    def get_daily_series_arrays(self, topic, platform=None):
+        """Columnar get_aggregated_daily_data: the series as DailyArrays, with dates never formatted as strings."""
+        return self.get_series_arrays(topic, platform, "D", "UTC")
+
+    def get_series_arrays(self, topic, platform=None, frequency="D", tz=None, periods=None):
+        """The series as DailyArrays bucketed by frequency (H, D, W or M) in timezone tz.
+
+        tz defaults to AGGREGATION_TIMEZONE. Day, week and month buckets in UTC
+        are regrouped from the engagements_daily rollup once it holds every day
+        the query reads (see rollup_ready); hourly buckets, other timezones and
+        reads the rollup cannot answer yet are aggregated from the raw
+        engagements. Only the training window of a forecast of periods (see
+        training_window) is read.
+        """
+        try:
+            tz = tz or settings.AGGREGATION_TIMEZONE
+            window = training_window(frequency, periods)
+            from_rollup = rollup_covers(frequency_unit(frequency), tz) and self.rollup_ready(window_since(window))
+            collection = self.daily if from_rollup else self.engagements
+            pipeline = series_arrays_pipeline(topic, platform, frequency, tz, window, raw=not from_rollup)
+            results = list(collection.aggregate(pipeline))
+            series = daily_arrays_result(results)
+            logger.info(
+                f"Retrieved {len(series)} aggregated data points for topic: {topic}, platform: {platform}, "
+                f"frequency: {frequency}, timezone: {tz}, window: {window}"
+            )
+            return series
+        except Exception as e:
+            logger.error(f"Error retrieving series arrays: {str(e)}")
+            raise
+
+    def get_aggregated_daily_data_many(self, series, columnar=False, since=None):
+        """Get daily aggregated data for many (topic, platform) pairs with a single $in query on the rollup.
+
+        A platform of None aggregates across all platforms for the topic, as in
+        get_aggregated_daily_data. Returns a dict mapping each (topic, platform)
+        pair to its list of {"ds", "y", "count"} rows, where count is the number
+        of raw documents that fell on that day. With columnar=True each pair maps
+        to DailyArrays instead. since drops days before it. Check rollup_ready(since)
+        first: series with days missing from the rollup come back short.
+        """
+        try:
+            series = list(dict.fromkeys(series))
+            logger.info(f"Retrieving aggregated daily data for {len(series)} series")
+
+            rows = self.daily.find(daily_many_query(series, since), DAILY_MANY_PROJECTION)
+            results = combine_daily_rows(rows, series, columnar)
+
+            logger.info(f"Retrieved aggregated data for {sum(1 for rows in results.values() if rows)} non-empty series")
+            return results
+        except Exception as e:
+            logger.error(f"Error retrieving aggregated data for many series: {str(e)}")
+            raise
+
     def get_recent_platform_average(self, topic, platform, days=7):
         """Get average engagement for a topic and platform over recent days."""
         try:
             topic = topic.lower()  # Normalize topic case
-            cutoff_date = datetime.utcnow() - timedelta(days=days)
-            
-            # Build query
-            query = {
-                "topic": topic,
-                "platform": platform,
-                "timestamp": {"$gte": cutoff_date}
-            }
             
-            # Execute query
-            results = list(self.engagements.find(query))
+            cached = recent_averages.get(topic, platform, days)
+            if cached is not None:
+                return cached[0]
             
-            if not results:
-                logger.info(f"No recent data for {topic}/{platform}")
-                return 0
-            
-            # Calculate average
-            total = sum(doc.get("value", 0) for doc in results)
-            avg = total / len(results)
-            
-            logger.info(f"Average engagement for {topic}/{platform}: {avg} (from {len(results)} records)")
-            return avg
+            # Average on the server; only the total and count come back
+            results = list(self.engagements.aggregate(recent_average_pipeline(topic, platform, days)))
+            return recent_average_result(topic, platform, days, results)
         except Exception as e:
             logger.error(f"Error calculating recent average: {str(e)}")
             return 0
 
+    def get_recent_platform_averages(self, topic, platforms, days=7):
+        """Get average engagement over recent days for several platforms of a topic with one aggregation."""
+        try:
+            topic = topic.lower()  # Normalize topic case
+            
+            averages = {}
+            missing = []
+            for platform in platforms:
+                cached = recent_averages.get(topic, platform, days)
+                if cached is not None:
+                    averages[platform] = cached[0]
+                else:
+                    missing.append(platform)
+            
+            if missing:
+                results = list(self.engagements.aggregate(recent_averages_pipeline(topic, missing, days)))
+                averages.update(recent_averages_result(topic, missing, days, results))
+            return averages
+        except Exception as e:
+            logger.error(f"Error calculating recent averages: {str(e)}")
+            return {platform: 0 for platform in platforms}
+
+    def get_data_statistics(self):
+        """Collections, approximate document total, and document counts by topic and by platform.
+        
+        Counts are summed from the engagements_daily rollup rather than grouped
+        over the raw collection, so documents stored without a timestamp are
+        not included.
+        """
+        try:
+            topics = {row["_id"]: row["count"] for row in self.daily.aggregate(document_counts_pipeline("topic"))}
+            platforms = self.daily.aggregate(document_counts_pipeline("platform"))
+            return {
+                "collections": self.db.list_collection_names(),
+                # Time-series collections are views, which have no metadata count
+                "documents": sum(topics.values()) if timeseries_storage() else self.engagements.estimated_document_count(),
+                "topics": topics,
+                "platforms": {row["_id"]: row["count"] for row in platforms}
+            }
+        except Exception as e:
+            logger.error(f"Error computing data statistics: {str(e)}")
+            raise
+
     def get_search_volume(self, topic, days=30):
         """Get search volume for a topic over time."""
         try:
             topic = topic.lower()  # Normalize topic case
-            cutoff_date = datetime.utcnow() - timedelta(days=days)
-            
-            # Build pipeline for daily aggregation
-            pipeline = [
-                {"$match": {
-                    "topic": topic,
-                    "platform": "search_volume",
-                    "timestamp": {"$gte": cutoff_date}
-                }},
-                {"$group": {
-                    "_id": {
-                        "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}
-                    },
-                    "count": {"$sum": "$value"}
-                }},
-                {"$sort": {"_id.date": 1}}
-            ]
             
             # Execute aggregation
-            results = list(self.engagements.aggregate(pipeline))
+            results = list(self.engagements.aggregate(search_volume_pipeline(topic, days)))
             
             # Format results
             volume_data = [
@@ -0,0 +1,257 @@
+"""Index bootstrap and query-plan verification for the engagements and engagements_daily collections.
+
+Usage:
+    python -m app.database.indexes                 # report queries not covered by an index
+    python -m app.database.indexes --ensure        # create missing indexes, then report
+    python -m app.database.indexes --topic ai --platform twitter
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, IndexModel
+
+from .db import HISTORY_SORT, history_stream_sort, engagement_field, engagement_projection, timeseries_storage
+
+# Add parent directory to path to find root config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import settings
+
+logger = logging.getLogger("mcp2.indexes")
+
+# Every query shape in Database filters on topic (and usually platform) and ranges or sorts on timestamp.
+# History pages sort on (timestamp, _id), so _id ends the topic-first indexes; they still serve every
+# prefix query, which makes the older topic_platform_timestamp and topic_timestamp indexes redundant.
+ENGAGEMENT_INDEXES = [
+    IndexModel(
+        [("topic", ASCENDING), ("platform", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)],
+        name="topic_platform_timestamp_id"
+    ),
+    IndexModel(
+        [("platform", ASCENDING), ("topic", ASCENDING), ("timestamp", ASCENDING)],
+        name="platform_topic_timestamp"
+    ),
+    # Topic-only reads sorted by timestamp (all platforms of a topic)
+    IndexModel(
+        [("topic", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)],
+        name="topic_timestamp_id"
+    ),
+]
+
+# Same query shapes against a time-series collection, where topic and platform live under the metaField.
+# Time-series collections cannot index _id, so a history page sorted on (timestamp, _id) is a blocking
+# sort of every matching point from the cursor on, not just of equal timestamps; verify_query_plans
+# reports that shape as not covered.
+TIMESERIES_INDEXES = [
+    IndexModel(
+        [("meta.topic", ASCENDING), ("meta.platform", ASCENDING), ("timestamp", ASCENDING)],
+        name="meta_topic_platform_timestamp"
+    ),
+    IndexModel(
+        [("meta.platform", ASCENDING), ("meta.topic", ASCENDING), ("timestamp", ASCENDING)],
+        name="meta_platform_topic_timestamp"
+    ),
+    IndexModel(
+        [("meta.topic", ASCENDING), ("timestamp", ASCENDING)],
+        name="meta_topic_timestamp"
+    ),
+]
+
+# One engagements_daily row per (topic, platform, day); unique so concurrent upserts cannot duplicate a day
+DAILY_INDEXES = [
+    IndexModel(
+        [("topic", ASCENDING), ("platform", ASCENDING), ("day", ASCENDING)],
+        name="topic_platform_day",
+        unique=True
+    ),
+]
+
+# Plan stages that mean the query scanned or sorted without an index
+UNINDEXED_STAGES = {"COLLSCAN", "SORT"}
+
+
+def engagement_indexes():
+    """Indexes for the raw engagements collection of the configured storage layout."""
+    return TIMESERIES_INDEXES if timeseries_storage() else ENGAGEMENT_INDEXES
+
+
+def ensure_indexes(collection, indexes=None):
+    """Create any missing indexes on collection. Existing indexes are left untouched."""
+    indexes = engagement_indexes() if indexes is None else indexes
+    names = collection.create_indexes(indexes)
+    logger.info(f"Ensured indexes on {collection.name}: {', '.join(names)}")
+    return names
+
+
+def ensure_timeseries_collection(db, name=None, granularity=None):
+    """Create the time-series collection for raw engagements if it does not exist yet. Returns it."""
+    name = name or settings.TIMESERIES_COLLECTION
+    if name not in db.list_collection_names():
+        db.create_collection(name, timeseries={
+            "timeField": "timestamp",
+            "metaField": "meta",
+            "granularity": granularity or settings.TIMESERIES_GRANULARITY
+        })
+        logger.info(f"Created time-series collection {name}")
+    return db[name]
+
+
+def representative_queries(topic, platform):
+    """(name, filter, sort) for each query shape Database issues against the raw engagements."""
+    since = datetime.utcnow() - timedelta(days=7)
+    t, p = engagement_field("topic"), engagement_field("platform")
+    return [
+        ("get_historical_data(topic)", {t: topic}, [("timestamp", ASCENDING)]),
+        ("get_historical_data(topic, platform)", {t: topic, p: platform}, [("timestamp", ASCENDING)]),
+        ("get_historical_page(topic, platform)", {t: topic, p: platform}, HISTORY_SORT),
+        ("iter_historical_data(topic, platform)", {t: topic, p: platform}, history_stream_sort()),
+        ("get_series_arrays(topic, platform, 'H')", {t: topic, p: platform, "timestamp": {"$type": "date"}}, None),
+        ("get_recent_platform_average", {t: topic, p: platform, "timestamp": {"$gte": since}}, None),
+        ("get_recent_platform_averages", {t: topic, p: {"$in": [platform]}, "timestamp": {"$gte": since}}, None),
+        ("get_search_volume", {t: topic, p: "search_volume", "timestamp": {"$gte": since}}, None),
+    ]
+
+
+def rollup_queries(topic, platform):
+    """(name, filter, sort) for each query shape Database issues against engagements_daily."""
+    since = datetime.utcnow() - timedelta(days=365)
+    return [
+        ("get_aggregated_daily_data(topic)", {"topic": topic}, None),
+        ("get_aggregated_daily_data(topic, platform)", {"topic": topic, "platform": platform}, None),
+        ("get_aggregated_daily_data_many", {"topic": {"$in": [topic]}, "platform": {"$in": [platform]}}, None),
+        ("get_series_arrays(topic, platform) in a training window",
+         {"topic": topic, "platform": platform, "day": {"$gte": since}}, None),
+    ]
+
+
+def _plan_stages(plan):
+    """Collect stage names from a winning plan, including nested input stages."""
+    stages = []
+    if not isinstance(plan, dict):
+        return stages
+    if "stage" in plan:
+        stages.append(plan["stage"])
+    for key in ("inputStage", "queryPlan"):
+        stages.extend(_plan_stages(plan.get(key)))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+def explain_query(collection, query, sort=None):
+    """Return (stages, index_names) of the winning plan for a find query.
+
+    Only the planner runs ("queryPlanner" verbosity); the query itself is not executed.
+    """
+    command = {"find": collection.name, "filter": query}
+    if sort:
+        command["sort"] = dict(sort)
+    explained = collection.database.command("explain", command, verbosity="queryPlanner")
+    stages = []
+    # Time-series collections explain as an aggregation over their buckets, where a blocking
+    # sort of the unpacked points shows up as a $sort stage after the bucket cursor
+    if "queryPlanner" not in explained and explained.get("stages"):
+        stages = ["SORT" for stage in explained["stages"] if "$sort" in stage]
+        explained = explained["stages"][0].get("$cursor", {})
+    plan = explained.get("queryPlanner", {}).get("winningPlan", {})
+    stages = _plan_stages(plan) + stages
+    if timeseries_storage() and sort and any(field == "_id" for field, _ in sort):
+        # No time-series index can end in _id, whatever the plan is called on this server version
+        stages.append("SORT")
+    index_names = sorted(set(_index_names(plan)))
+    return stages, index_names
+
+
+def _index_names(plan):
+    if not isinstance(plan, dict):
+        return []
+    names = [plan["indexName"]] if "indexName" in plan else []
+    for key in ("inputStage", "queryPlan"):
+        names.extend(_index_names(plan.get(key)))
+    for child in plan.get("inputStages", []):
+        names.extend(_index_names(child))
+    return names
+
+
+def verify_query_plans(database, topic=None, platform=None):
+    """Explain every representative query on engagements and engagements_daily; return a report entry per query shape."""
+    if topic is None or platform is None:
+        sample = database.engagements.find_one({}, engagement_projection(["topic", "platform"])) or {}
+        topic = topic or sample.get("topic", "example")
+        platform = platform or sample.get("platform", "twitter")
+
+    report = []
+    for collection, queries in (
+        (database.engagements, representative_queries(topic, platform)),
+        (database.daily, rollup_queries(topic, platform))
+    ):
+        for name, query, sort in queries:
+            stages, index_names = explain_query(collection, query, sort)
+            unindexed = sorted(UNINDEXED_STAGES.intersection(stages))
+            report.append({
+                "query": name,
+                "collection": collection.name,
+                "covered": not unindexed,
+                "indexes": index_names,
+                "unindexed_stages": unindexed
+            })
+    return report
+
+
+def bootstrap_indexes(database, ensure=True, verify=True):
+    """Startup step: create missing indexes and log any query shape that is still not index-backed.
+
+    Index builds block until they finish, so call this from a thread rather than the event loop.
+    """
+    try:
+        if ensure:
+            if timeseries_storage():
+                ensure_timeseries_collection(database.db)
+            ensure_indexes(database.engagements)
+            ensure_indexes(database.daily, DAILY_INDEXES)
+        if verify:
+            for entry in verify_query_plans(database):
+                if entry["covered"]:
+                    logger.info(f"Query {entry['query']} uses index: {', '.join(entry['indexes'])}")
+                else:
+                    logger.warning(
+                        f"Query {entry['query']} is not covered by an index "
+                        f"(plan stages: {', '.join(entry['unindexed_stages'])})"
+                    )
+    except Exception as e:
+        # Never block startup on index maintenance
+        logger.error(f"Index bootstrap failed: {str(e)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ensure and verify indexes on the engagements collection.")
+    parser.add_argument("--ensure", action="store_true", help="create missing indexes before reporting")
+    parser.add_argument("--topic", help="topic to use in explained queries (default: a sampled document)")
+    parser.add_argument("--platform", help="platform to use in explained queries (default: a sampled document)")
+    args = parser.parse_args()
+
+    # Add the project root to the path
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from app.database.db import Database
+
+    database = Database()
+    if args.ensure:
+        if timeseries_storage():
+            ensure_timeseries_collection(database.db)
+        ensure_indexes(database.engagements)
+        ensure_indexes(database.daily, DAILY_INDEXES)
+
+    report = verify_query_plans(database, args.topic, args.platform)
+    uncovered = [entry for entry in report if not entry["covered"]]
+    for entry in report:
+        status = "OK" if entry["covered"] else "NOT COVERED"
+        detail = ", ".join(entry["indexes"]) if entry["covered"] else ", ".join(entry["unindexed_stages"])
+        print(f"{status:<12} {entry['collection']:<18} {entry['query']:<55} {detail}")
+    print(f"\n{len(report) - len(uncovered)}/{len(report)} query shapes use an index")
+    sys.exit(1 if uncovered else 0)
+
+
+if __name__ == "__main__":
+    main()
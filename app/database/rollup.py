@@ -0,0 +1,152 @@
+"""Backfill or rebuild the engagements_daily rollup from the raw engagements collection.
+
+Usage:
+    python -m app.database.rollup                     # rebuild every topic, up to today
+    python -m app.database.rollup --topic ai          # rebuild one topic
+    python -m app.database.rollup --since 2024-01-01  # rebuild days from a date on
+    python -m app.database.rollup --until 2024-06-01  # rebuild days before a date
+
+Rows are recomputed with one aggregation and written with $merge, replacing
+the stored totals for each (topic, platform, day) in [since, until). Rows in
+that range that were not rebuilt (days without raw data any more) are deleted
+afterwards, so a failed rebuild leaves the existing rows in place.
+
+until defaults to today (UTC), and live writes keep today and later days up
+to date with $inc. The service records the first full day it kept live
+(live_since, the day after it first started) in the rollup_state collection,
+and a rebuild of every topic records how far it got (backfilled_through).
+Forecasts only read the rollup for days it holds in full, and aggregate the
+raw engagements until backfilled_through reaches live_since. That makes the
+cutover safe: deploy the rollup, then run the backfill the next day (or any
+later day) once every instance runs the new version. Ingestion carries on
+meanwhile. A write that lands in a day being rebuilt while the rebuild runs
+may be missed, so rerun the rebuild for days that receive late data.
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+
+from .indexes import DAILY_INDEXES
+from .db import day_bucket, engagement_field, ROLLUP_STATE_ID
+
+logger = logging.getLogger("mcp2.rollup")
+
+
+def rebuild_pipeline(topic=None, since=None, until=None, rebuilt_at=None):
+    """Aggregation that recomputes rollup rows from raw engagements and merges them into engagements_daily.
+
+    Merged rows are stamped with rebuilt_at so rows the rebuild did not produce can be told apart.
+    """
+    # $merge needs every "on" field present, so documents without a topic or platform are left out
+    match_stage = {
+        "timestamp": {"$type": "date"},
+        engagement_field("topic"): {"$type": "string"},
+        engagement_field("platform"): {"$type": "string"}
+    }
+    if topic:
+        match_stage[engagement_field("topic")] = topic
+    if since:
+        match_stage["timestamp"]["$gte"] = since
+    if until:
+        match_stage["timestamp"]["$lt"] = until
+
+    return [
+        {"$match": match_stage},
+        {"$group": {
+            "_id": {
+                "topic": f"${engagement_field('topic')}",
+                "platform": f"${engagement_field('platform')}",
+                # UTC midnight; works on servers without $dateTrunc
+                "day": {"$dateFromString": {
+                    "dateString": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}
+                }}
+            },
+            "y": {"$sum": "$value"},
+            "count": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            "topic": "$_id.topic",
+            "platform": "$_id.platform",
+            "day": "$_id.day",
+            "y": 1,
+            "count": 1,
+            "rebuilt_at": {"$literal": rebuilt_at}
+        }},
+        {"$merge": {
+            "into": "engagements_daily",
+            "on": ["topic", "platform", "day"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+
+def rebuild_rollup(database, topic=None, since=None, until=None):
+    """Rebuild engagements_daily rows for topic (or all topics) for days in [since, until).
+
+    since defaults to the beginning and until to today (UTC midnight), so days
+    still receiving live writes are left to the $inc updates. Rebuilding
+    every topic also moves the backfill marker (see record_backfill).
+    """
+    database.daily.create_indexes(DAILY_INDEXES)
+    until = until or day_bucket(datetime.utcnow())
+    rebuilt_at = datetime.utcnow()
+
+    database.engagements.aggregate(rebuild_pipeline(topic, since, until, rebuilt_at), allowDiskUse=True)
+
+    # Only after the merge succeeded: drop rows in the range for days that no longer have raw data
+    day_range = {"day": {"$lt": until}}
+    if since:
+        day_range["day"]["$gte"] = since
+    if topic:
+        day_range["topic"] = topic
+    deleted = database.daily.delete_many({**day_range, "rebuilt_at": {"$ne": rebuilt_at}}).deleted_count
+    logger.info(f"Removed {deleted} stale rollup rows")
+
+    if topic is None:
+        record_backfill(database, since, until)
+
+    rows = database.daily.count_documents(day_range)
+    logger.info(f"Rebuilt {rows} rollup rows for topic: {topic or 'all'} before {until.date()}")
+    return rows
+
+
+def record_backfill(database, since, until):
+    """Move backfilled_through in rollup_state to until after every topic was rebuilt over [since, until).
+
+    A rebuild from since on only extends the marker when it already covered
+    every day before since.
+    """
+    state = database.rollup_state.find_one({"_id": ROLLUP_STATE_ID}) or {}
+    backfilled_through = state.get("backfilled_through")
+    if since is not None and (backfilled_through is None or backfilled_through < since):
+        logger.info(f"Backfill marker left at {backfilled_through}: days before {since.date()} were not rebuilt")
+        return
+    database.rollup_state.update_one(
+        {"_id": ROLLUP_STATE_ID}, {"$max": {"backfilled_through": until}}, upsert=True
+    )
+    logger.info(f"Rollup backfilled through {until.date()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill or rebuild the engagements_daily rollup collection.")
+    parser.add_argument("--topic", help="only rebuild this topic")
+    parser.add_argument("--since", help="only rebuild days on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--until", help="only rebuild days before this date (YYYY-MM-DD, default today)")
+    args = parser.parse_args()
+
+    # Add the project root to the path
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from app.database.db import Database
+
+    since = datetime.strptime(args.since, "%Y-%m-%d") if args.since else None
+    until = datetime.strptime(args.until, "%Y-%m-%d") if args.until else None
+    rows = rebuild_rollup(Database(), args.topic, since, until)
+    print(f"Rebuilt {rows} rollup rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Copy raw engagements into the MongoDB time-series collection used by ENGAGEMENTS_STORAGE=timeseries.
+
+Usage:
+    python -m app.database.timeseries                     # copy every engagement
+    python -m app.database.timeseries --topic ai          # copy one topic
+    python -m app.database.timeseries --since 2024-01-01  # copy engagements from a date on
+
+The target collection (TIMESERIES_COLLECTION) is created with timeField
+"timestamp" and metaField "meta" ({topic, platform}) if it does not exist,
+and its indexes are ensured. Documents are read from the engagements
+collection in timestamp order and written with unordered insert_many
+batches. Documents without a date timestamp cannot be stored in a
+time-series collection and are skipped. Time-series collections have no
+unique keys, so copying the same range twice duplicates it: run it while
+ingestion is paused, then set ENGAGEMENTS_STORAGE=timeseries. The daily
+rollup does not change.
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+
+from .indexes import TIMESERIES_INDEXES, ensure_indexes, ensure_timeseries_collection
+
+logger = logging.getLogger("mcp2.timeseries")
+
+
+def timeseries_document(data):
+    """A flat engagement document in the time-series layout (topic and platform under meta)."""
+    document = {key: value for key, value in data.items() if key not in ("_id", "topic", "platform")}
+    document["meta"] = {"topic": data.get("topic"), "platform": data.get("platform")}
+    return document
+
+
+def migrate(db, topic=None, since=None, batch_size=1000, target=None):
+    """Copy engagements into the time-series collection; returns (copied, skipped)."""
+    collection = ensure_timeseries_collection(db, target)
+    ensure_indexes(collection, TIMESERIES_INDEXES)
+
+    query = {"timestamp": {"$type": "date"}}
+    if topic:
+        query["topic"] = topic
+    if since:
+        query["timestamp"]["$gte"] = since
+
+    skipped_query = {key: value for key, value in query.items() if key != "timestamp"}
+    skipped_query["timestamp"] = {"$not": {"$type": "date"}}
+    skipped = db.engagements.count_documents(skipped_query)
+
+    copied = 0
+    batch = []
+    for data in db.engagements.find(query, batch_size=batch_size).sort("timestamp", 1):
+        batch.append(timeseries_document(data))
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+            logger.info(f"Copied {copied} engagements")
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        copied += len(batch)
+
+    logger.info(f"Copied {copied} engagements into {collection.name}, skipped {skipped} without a date timestamp")
+    return copied, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy engagements into the time-series engagements collection.")
+    parser.add_argument("--topic", help="only copy this topic")
+    parser.add_argument("--since", help="only copy engagements on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="documents per insert_many")
+    args = parser.parse_args()
+
+    # Add the project root to the path
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from app.database.client import get_client
+
+    since = datetime.strptime(args.since, "%Y-%m-%d") if args.since else None
+    copied, skipped = migrate(get_client().mcp2, args.topic, since, args.batch_size)
+    print(f"Copied {copied} engagements, skipped {skipped} without a date timestamp")
+
+
+if __name__ == "__main__":
+    main()
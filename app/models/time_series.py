@@ -15,6 +15,12 @@ class ForecastRequest(BaseModel):
     periods: int = 7
     frequency: str = "D"
     include_history: bool = True
+    # Predict only the horizon with approximate bands instead of full uncertainty simulation
+    fast_predict: bool = False
+    # Forecasting engine name, or "auto" to choose by series length (defaults to FORECAST_ENGINE)
+    engine: Optional[str] = None
+    # IANA timezone the frequency buckets are aligned to (defaults to AGGREGATION_TIMEZONE)
+    timezone: Optional[str] = None
 
 class ForecastResponse(BaseModel):
     topic: str
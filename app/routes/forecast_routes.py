@@ -1,9 +1,28 @@
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from datetime import datetime
+import asyncio
+import json
 import logging
 import traceback
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from ..models.time_series import TimeSeriesData, ForecastRequest, ForecastResponse
 from ..services.prophet_service import ProphetService
-from ..database.db import Database
+from ..services.forecast_executor import (
+    ForecastExecutor, ForecastQueueFull, run_series_forecast_job
+)
+from ..services.result_cache import ForecastResultCache
+from ..services.forecast_engines import available_engines
+from ..services.single_flight import SingleFlight
+from ..services.ingestion_buffer import IngestionBuffer, IngestionBufferFull
+from ..services.bulk_ingest import BulkIngestor, iter_json_array, iter_ndjson
+from ..services.data_statistics import DataStatistics
+from ..database.db import (
+    Database, series_versions, history_projection, frequency_unit, is_utc, training_window
+)
+from ..database.async_db import AsyncDatabase
+from config import settings
 
 # Configure logging
 logging.basicConfig(
@@ -17,8 +36,15 @@ logging.basicConfig(
 logger = logging.getLogger("forecast_routes")
 
 router = APIRouter()
-prophet_service = ProphetService()
+# Routes use the async database; the sync one is kept for index bootstrap at startup
 db = Database()
+adb = AsyncDatabase()
+prophet_service = ProphetService(db, adb)
+forecast_executor = ForecastExecutor()
+forecast_result_cache = ForecastResultCache()
+forecast_flights = SingleFlight()
+ingestion_buffer = IngestionBuffer(adb)
+data_statistics = DataStatistics(adb)
 
 @router.post("/store-engagement")
 async def store_engagement(data: TimeSeriesData, request: Request):
@@ -30,9 +56,6 @@ async def store_engagement(data: TimeSeriesData, request: Request):
         data_dict = data.dict()
         logger.info(f"Data to store: {data_dict}")
         
-        # Store in database
-        db.store_engagement_data(data_dict)
-        
         # Track search volume - increment search count for this topic
         # This creates a separate record to track searches
         search_data = {
@@ -45,15 +68,56 @@ async def store_engagement(data: TimeSeriesData, request: Request):
                 "query_platform": data.platform
             }
         }
-        db.store_engagement_data(search_data)
+        
+        if settings.INGEST_BUFFER_ENABLED:
+            # Acknowledge now; the buffer writes both documents in its next batch
+            ingestion_buffer.submit([data_dict, search_data])
+            logger.info(f"Data queued for storage for topic: {data.topic}")
+            return {"status": "success", "message": "Data accepted for storage"}
+        
+        # Store in database
+        await adb.store_engagement_data(data_dict)
+        await adb.store_engagement_data(search_data)
         
         logger.info(f"Data successfully stored for topic: {data.topic}")
         return {"status": "success", "message": "Data stored successfully"}
+    except IngestionBufferFull as e:
+        logger.warning(f"Rejecting engagement data: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         error_trace = traceback.format_exc()
         logger.error(f"Error storing engagement data: {str(e)}\n{error_trace}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/store-engagements/bulk")
+async def store_engagements_bulk(request: Request):
+    """Store many TimeSeriesData records from a JSON array or an NDJSON stream.
+
+    The body is parsed and validated as it arrives and written in
+    INGEST_BULK_CHUNK_SIZE insert_many chunks, so memory does not grow with
+    the number of rows. Invalid rows are skipped and reported by index.
+    """
+    client_host = request.client.host
+    content_type = request.headers.get("content-type", "")
+    ndjson = "ndjson" in content_type or "jsonlines" in content_type
+    ingestor = BulkIngestor(adb, client_host)
+    try:
+        records = iter_ndjson(request.stream()) if ndjson else iter_json_array(request.stream())
+        async for record, error in records:
+            await ingestor.add(record, error)
+        summary = await ingestor.finish()
+        logger.info(f"Bulk ingestion from {client_host}: {summary['stored']} stored, {summary['rejected']} rejected")
+        return {"status": "success", **summary}
+    except ValueError as e:
+        # Rows before the malformed part are still stored
+        summary = await ingestor.finish()
+        logger.warning(f"Malformed bulk ingestion body from {client_host}: {str(e)}")
+        raise HTTPException(status_code=400, detail={"error": str(e), **summary})
+    except Exception as e:
+        error_trace = traceback.format_exc()
+        logger.error(f"Error in bulk ingestion: {str(e)}\n{error_trace}")
+        raise HTTPException(status_code=500, detail={"error": str(e), **ingestor.summary()})
+
 @router.post("/store-platform-engagements")
 async def store_platform_engagements(request: Request):
     """Store detailed engagement metrics from all platforms."""
@@ -96,7 +160,21 @@ async def store_platform_engagements(request: Request):
         # Store aggregate engagement for each platform
         timestamp = data.get("timestamp") or results[0].get("timestamp") if results else None
         
-        stored_platforms = []
+        platform_statuses = data.get("stats", {}).get("platform_status", {})
+        
+        # Platforms that failed get a fallback value from recent history, fetched in one aggregation
+        failed_platforms = [
+            platform for platform in engagements_by_platform
+            if platform_statuses.get(platform) != "success"
+        ]
+        fallbacks = {}
+        if failed_platforms:
+            try:
+                fallbacks = await adb.get_recent_platform_averages(topic, failed_platforms, days=7)
+            except Exception as e:
+                logger.error(f"Error getting historical data: {str(e)}")
+        
+        platform_documents = []
         for platform, metrics in engagements_by_platform.items():
             # Calculate weighted engagement score
             engagement_score = (
@@ -116,145 +194,373 @@ async def store_platform_engagements(request: Request):
                     "likes": metrics["total_likes"],
                     "shares": metrics["total_shares"],
                     "comments": metrics["total_comments"],
-                    "api_status": data.get("stats", {}).get("platform_status", {}).get(platform, "unknown")
+                    "api_status": platform_statuses.get(platform, "unknown")
                 }
             }
             
-            # Handle platform failures gracefully
-            platform_status = data.get("stats", {}).get("platform_status", {}).get(platform)
-            if platform_status != "success":
-                # If platform failed but we're still tracking the search,
-                # use a reasonable fallback value based on historical data
-                try:
-                    historical = db.get_recent_platform_average(topic, platform, days=7)
-                    if historical > 0:
-                        platform_data["value"] = historical
-                        platform_data["metadata"]["estimated"] = True
-                        logger.info(f"Using estimated engagement for {platform}: {historical}")
-                except Exception as e:
-                    logger.error(f"Error getting historical data: {str(e)}")
+            # Handle platform failures gracefully: if the platform failed but we're
+            # still tracking the search, use a reasonable fallback value based on historical data
+            historical = fallbacks.get(platform, 0)
+            if historical > 0:
+                platform_data["value"] = historical
+                platform_data["metadata"]["estimated"] = True
+                logger.info(f"Using estimated engagement for {platform}: {historical}")
             
-            db.store_engagement_data(platform_data)
-            stored_platforms.append(platform)
+            platform_documents.append(platform_data)
+        
+        # One insert_many for every platform plus one bulk_write for their rollup rows
+        written = await adb.store_engagement_batch(platform_documents)
+        written_ids = {id(document) for document in written}
+        stored_platforms = [document["platform"] for document in written]
+        failed_platforms = [
+            document["platform"] for document in platform_documents if id(document) not in written_ids
+        ]
+        if failed_platforms and not stored_platforms:
+            raise HTTPException(status_code=500, detail=f"Failed to store engagement data for {', '.join(failed_platforms)}")
         
-        return {
-            "status": "success", 
+        response = {
+            "status": "success" if not failed_platforms else "partial",
             "message": f"Stored engagement data for {len(stored_platforms)} platforms",
             "platforms": stored_platforms
         }
+        if failed_platforms:
+            logger.error(f"Failed to store engagement data for topic: {topic}, platforms: {failed_platforms}")
+            response["message"] += f"; {len(failed_platforms)} failed"
+            response["failed_platforms"] = failed_platforms
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         error_trace = traceback.format_exc()
         logger.error(f"Error storing platform engagements: {str(e)}\n{error_trace}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def build_forecast_response(request: ForecastRequest, result) -> ForecastResponse:
+    """Build the API response from a ProphetService forecast tuple."""
+    (
+        forecast_dates,
+        forecast_values,
+        lower_bounds,
+        upper_bounds,
+        historical_dates,
+        historical_values
+    ) = result
+
+    return ForecastResponse(
+        topic=request.topic,
+        platform=request.platform,
+        forecast_dates=forecast_dates,
+        forecast_values=forecast_values,
+        lower_bounds=lower_bounds,
+        upper_bounds=upper_bounds,
+        historical_dates=historical_dates if request.include_history else None,
+        historical_values=historical_values if request.include_history else None
+    )
+
+def forecast_cache_key(request: ForecastRequest):
+    return (
+        request.topic,
+        request.platform or None,
+        request.periods,
+        request.frequency,
+        request.fast_predict,
+        request.engine or settings.FORECAST_ENGINE,
+        request.timezone or settings.AGGREGATION_TIMEZONE
+    )
+
+def validate_engine(request: ForecastRequest):
+    if request.engine and request.engine != 'auto' and request.engine not in available_engines():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown engine: {request.engine}. Available: auto, {', '.join(available_engines())}"
+        )
+
+def validate_buckets(request: ForecastRequest):
+    """Reject frequencies without a database bucket unit and unknown timezones before querying."""
+    try:
+        frequency_unit(request.frequency)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.timezone and not is_utc(request.timezone):
+        try:
+            ZoneInfo(request.timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise HTTPException(status_code=400, detail=f"Unknown timezone: {request.timezone}")
+
+def uses_daily_rollup(request: ForecastRequest):
+    """Whether the series is plain UTC rollup days, which the batch endpoint loads for many series at once."""
+    if frequency_unit(request.frequency) != "day" or not is_utc(request.timezone or settings.AGGREGATION_TIMEZONE):
+        return False
+    window = training_window(request.frequency, request.periods)
+    return window is None or window.downsample_unit is None
+
 @router.post("/forecast", response_model=ForecastResponse)
 async def get_forecast(request: ForecastRequest):
     try:
         logger.info(f"Received forecast request for topic: {request.topic}, platform: {request.platform}")
+        validate_engine(request)
+        validate_buckets(request)
         
-        # Check if we have historical data
-        historical_data = db.get_historical_data(request.topic, request.platform)
-        if not historical_data:
-            logger.warning(f"No historical data found for topic: {request.topic}, platform: {request.platform}")
-            raise HTTPException(status_code=404, detail="No historical data found for this topic/platform")
+        # Serve repeated requests from the result cache while no new data has arrived
+        cache_key = forecast_cache_key(request)
+        data_version = series_versions.get(request.topic, request.platform)
+        cached = forecast_result_cache.get(cache_key, data_version)
+        if cached is not None:
+            logger.info(f"Serving cached forecast for topic: {request.topic}, platform: {request.platform}")
+            return build_forecast_response(request, cached)
         
-        logger.info(f"Found {len(historical_data)} historical data points, generating forecast")
+        async def compute_forecast():
+            # Load the series once; the worker fits on it without going back to the database
+            series = await prophet_service.load_series_async(
+                request.topic, request.platform, request.frequency, request.timezone, request.periods
+            )
+            if not series.daily_data:
+                logger.warning(f"No historical data found for topic: {request.topic}, platform: {request.platform}")
+                raise HTTPException(status_code=404, detail="No historical data found for this topic/platform")
             
-        (
-            forecast_dates,
-            forecast_values,
-            lower_bounds,
-            upper_bounds,
-            historical_dates,
-            historical_values
-        ) = prophet_service.make_forecast(
-            topic=request.topic,
-            platform=request.platform,
-            periods=request.periods,
-            frequency=request.frequency
-        )
-
-        response = ForecastResponse(
-            topic=request.topic,
-            platform=request.platform,
-            forecast_dates=forecast_dates,
-            forecast_values=forecast_values,
-            lower_bounds=lower_bounds,
-            upper_bounds=upper_bounds,
-            historical_dates=historical_dates if request.include_history else None,
-            historical_values=historical_values if request.include_history else None
-        )
+            logger.info(f"Found {len(series.daily_data)} {request.frequency} data points, generating forecast")
+            
+            result = await forecast_executor.submit(
+                run_series_forecast_job,
+                request.topic,
+                request.platform,
+                series.daily_data,
+                request.periods,
+                request.frequency,
+                request.fast_predict,
+                request.engine,
+                request.timezone or settings.AGGREGATION_TIMEZONE
+            )
+            forecast_result_cache.put(cache_key, data_version, result)
+            return result
+        
+        # Identical requests arriving while this one is fitting wait for the same result
+        result = await forecast_flights.run((cache_key, data_version), compute_forecast)
+        response = build_forecast_response(request, result)
 
         logger.info(f"Successfully generated forecast for topic: {request.topic}")
         return response
     except HTTPException:
         raise
+    except ForecastQueueFull as e:
+        logger.warning(f"Rejecting forecast request: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
+    except asyncio.TimeoutError:
+        logger.error(f"Forecast timed out for topic: {request.topic}")
+        raise HTTPException(status_code=504, detail="Forecast timed out")
     except Exception as e:
         error_trace = traceback.format_exc()
         logger.error(f"Error generating forecast: {str(e)}\n{error_trace}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/forecast/batch")
+async def get_forecast_batch(requests: List[ForecastRequest]):
+    """Forecast many topic/platform series in one call.
+
+    UTC daily series are loaded with one rollup query per training window
+    start once the rollup holds that window (other frequencies, timezones and
+    downsampled windows with one aggregation each), fitted in parallel in the
+    forecast process pool, and streamed back as NDJSON lines in completion
+    order. Each line carries the index of the request it answers.
+    """
+    try:
+        if not requests:
+            raise HTTPException(status_code=400, detail="No forecast requests provided")
+        if len(requests) > settings.FORECAST_BATCH_MAX_ITEMS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Batch too large: {len(requests)} items (max {settings.FORECAST_BATCH_MAX_ITEMS})"
+            )
+        for item in requests:
+            validate_engine(item)
+            validate_buckets(item)
+
+        logger.info(f"Received batch forecast request with {len(requests)} items")
+
+        keys = [(item.topic, item.platform or None) for item in requests]
+        versions = [series_versions.get(*key) for key in keys]
+        cached = {
+            index: forecast_result_cache.get(forecast_cache_key(item), version)
+            for index, (item, version) in enumerate(zip(requests, versions))
+        }
+        cached = {index: result for index, result in cached.items() if result is not None}
+
+        # Only series without a cached result need to be loaded; UTC daily ones with the
+        # same training window start share a single rollup query
+        missing = [index for index in range(len(requests)) if index not in cached]
+        by_start = {}
+        for index in missing:
+            if uses_daily_rollup(requests[index]):
+                window = training_window(requests[index].frequency, requests[index].periods)
+                by_start.setdefault(window.start if window else None, []).append(index)
+        item_series = {}
+        for since, indexes in by_start.items():
+            if not await adb.rollup_ready(since):
+                continue
+            series_data = await adb.get_aggregated_daily_data_many([keys[index] for index in indexes], True, since)
+            item_series.update({index: series_data.get(keys[index]) for index in indexes})
+        # Everything else, including windows the rollup does not hold in full yet (read from raw data)
+        for index in missing:
+            if index not in item_series:
+                item = requests[index]
+                item_series[index] = await adb.get_series_arrays(*keys[index], item.frequency, item.timezone, item.periods)
+    except HTTPException:
+        raise
+    except Exception as e:
+        error_trace = traceback.format_exc()
+        logger.error(f"Error loading batch forecast data: {str(e)}\n{error_trace}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Keep at most one job per worker queued from this batch so other requests still get through
+    semaphore = asyncio.Semaphore(forecast_executor.max_workers)
+
+    async def run_item(index, item, key):
+        entry = {"index": index, "topic": item.topic, "platform": item.platform}
+        if index in cached:
+            entry.update(status="success", forecast=build_forecast_response(item, cached[index]).dict())
+            return entry
+        daily_data = item_series.get(index)
+        if not daily_data:
+            entry.update(status="error", error="No historical data found for this topic/platform")
+            return entry
+        cache_key = forecast_cache_key(item)
+
+        async def compute_forecast():
+            async with semaphore:
+                result = await forecast_executor.submit(
+                    run_series_forecast_job,
+                    item.topic,
+                    key[1],
+                    daily_data,
+                    item.periods,
+                    item.frequency,
+                    item.fast_predict,
+                    item.engine,
+                    item.timezone or settings.AGGREGATION_TIMEZONE
+                )
+            forecast_result_cache.put(cache_key, versions[index], result)
+            return result
+
+        try:
+            result = await forecast_flights.run((cache_key, versions[index]), compute_forecast)
+            entry.update(status="success", forecast=build_forecast_response(item, result).dict())
+        except asyncio.TimeoutError:
+            entry.update(status="error", error="Forecast timed out")
+        except Exception as e:
+            logger.error(f"Error in batch forecast for topic: {item.topic}, platform: {item.platform}: {str(e)}")
+            entry.update(status="error", error=str(e))
+        return entry
+
+    async def stream_results():
+        tasks = [
+            asyncio.ensure_future(run_item(index, item, key))
+            for index, (item, key) in enumerate(zip(requests, keys))
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished) + "\n"
+        finally:
+            # Client went away or the stream finished: drop anything still pending
+            for task in tasks:
+                task.cancel()
+        logger.info(f"Completed batch forecast with {len(tasks)} items")
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 @router.get("/topics/{topic}/history")
-async def get_topic_history(topic: str, platform: str = None):
+async def get_topic_history(
+    topic: str,
+    platform: str = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    format: str = "json"
+):
+    """Historical data in timestamp order, between start (inclusive) and end (exclusive).
+
+    format=json returns one page of at most limit points plus next_cursor for
+    the following page. format=ndjson streams every matching point (or the
+    first limit) as one JSON object per line. fields is a comma separated
+    projection; timestamp is always included.
+    """
     try:
-        logger.info(f"Received history request for topic: {topic}, platform: {platform}")
+        logger.info(f"Received history request for topic: {topic}, platform: {platform}, format: {format}")
         
-        data = db.get_historical_data(topic, platform)
+        field_list = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+        if format not in ("json", "ndjson"):
+            raise HTTPException(status_code=400, detail="format must be json or ndjson")
+        if format == "ndjson" and cursor is not None:
+            raise HTTPException(status_code=400, detail="cursor only applies to format=json; ndjson streams every point")
+        if limit is not None and (limit < 1 or (format == "json" and limit > settings.HISTORY_MAX_PAGE_SIZE)):
+            raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.HISTORY_MAX_PAGE_SIZE}")
+        try:
+            history_projection(field_list)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        if not data:
+        if format == "ndjson":
+            async def stream_history():
+                async for document in adb.iter_historical_data(
+                    topic, platform, start, end, field_list, settings.HISTORY_STREAM_BATCH_SIZE, limit
+                ):
+                    yield json.dumps(document, default=str) + "\n"
+            
+            return StreamingResponse(stream_history(), media_type="application/x-ndjson")
+        
+        try:
+            data, next_cursor = await adb.get_historical_page(
+                topic, platform, start, end, limit or settings.HISTORY_PAGE_SIZE, field_list, cursor
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        if not data and cursor is None:
             logger.warning(f"No historical data found for topic: {topic}, platform: {platform}")
-            return {"topic": topic, "platform": platform, "data": [], "message": "No data found"}
+            return {"topic": topic, "platform": platform, "data": [], "next_cursor": None, "message": "No data found"}
             
         logger.info(f"Returning {len(data)} historical data points")
-        return {"topic": topic, "platform": platform, "data": data}
+        return {"topic": topic, "platform": platform, "data": data, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         error_trace = traceback.format_exc()
         logger.error(f"Error retrieving topic history: {str(e)}\n{error_trace}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/ready")
+async def readiness():
+    """Readiness probe: 200 once the forecast workers have loaded Prophet and CmdStan, 503 until then."""
+    if not forecast_executor.ready:
+        raise HTTPException(status_code=503, detail="Forecast workers are warming up")
+    return {"status": "ready"}
+
 @router.get("/health-check")
 async def health_check():
-    """Check service health and data status."""
+    """Constant-time liveness probe: answers from process state without querying MongoDB."""
+    return {
+        "status": "healthy",
+        "ready": forecast_executor.ready,
+        # Reflects the last background statistics refresh, not a live ping
+        "database": "connected" if data_statistics.healthy else "error"
+    }
+
+@router.get("/statistics")
+async def get_statistics():
+    """Document counts by topic and platform, from a snapshot refreshed every DATA_STATS_REFRESH_SECONDS."""
     try:
-        # Check MongoDB connection
-        db.client.admin.command('ping')
-        
-        # Check database collections
-        collection_names = db.db.list_collection_names()
-        
-        # Count records by topic
-        topic_counts = {}
-        try:
-            pipeline = [
-                {"$group": {"_id": "$topic", "count": {"$sum": 1}}},
-                {"$sort": {"count": -1}}
-            ]
-            topics = list(db.engagements.aggregate(pipeline))
-            for topic in topics:
-                topic_counts[topic["_id"]] = topic["count"]
-        except Exception as e:
-            logger.error(f"Error counting topics: {str(e)}")
-            
-        # Count records by platform
-        platform_counts = {}
-        try:
-            pipeline = [
-                {"$group": {"_id": "$platform", "count": {"$sum": 1}}},
-                {"$sort": {"count": -1}}
-            ]
-            platforms = list(db.engagements.aggregate(pipeline))
-            for platform in platforms:
-                platform_counts[platform["_id"]] = platform["count"]
-        except Exception as e:
-            logger.error(f"Error counting platforms: {str(e)}")
-            
-        return {
-            "status": "healthy",
-            "database": "connected",
-            "collections": collection_names,
-            "topics": topic_counts,
-            "platforms": platform_counts
-        }
+        return await data_statistics.get()
     except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Database connection error: {str(e)}") 
\ No newline at end of file
+        logger.error(f"Error retrieving data statistics: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database connection error: {str(e)}")
+
+@router.get("/metrics")
+async def get_metrics():
+    """Runtime metrics for the forecast pipeline."""
+    return {
+        "forecast_executor": forecast_executor.metrics(),
+        "result_cache": forecast_result_cache.metrics(),
+        "single_flight": forecast_flights.metrics(),
+        "ingestion_buffer": ingestion_buffer.metrics()
+    }
@@ -0,0 +1,202 @@
+import codecs
+import json
+import logging
+import os
+import sys
+
+from pydantic import ValidationError
+
+from ..models.time_series import TimeSeriesData
+from ..database.db import day_bucket
+
+# Add parent directory to path to find root config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import settings
+
+logger = logging.getLogger("bulk_ingest")
+
+# Rows rejected by validation are reported individually up to this many
+MAX_REPORTED_ERRORS = 100
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+async def iter_ndjson(chunks):
+    """Yield (record, error) for each line of an NDJSON byte stream; malformed lines yield (None, message)."""
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += text.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_line(line)
+    buffer += text.decode(b"", final=True)
+    if buffer.strip():
+        yield _parse_line(buffer)
+
+
+def _parse_line(line):
+    try:
+        return json.loads(line), None
+    except json.JSONDecodeError as e:
+        return None, f"Invalid JSON: {str(e)}"
+
+
+def _skip(buffer, pos, chars):
+    while pos < len(buffer) and buffer[pos] in chars:
+        pos += 1
+    return pos
+
+
+async def iter_json_array(chunks):
+    """Yield (record, None) for each element of a JSON array byte stream without reading it all first.
+
+    Elements are decoded as soon as they are complete in the buffered text.
+    Raises ValueError when the body is not a well-formed JSON array: elements
+    must be separated by exactly one comma, and nothing but whitespace may
+    follow the closing bracket.
+    """
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    # What comes next: "[" opens the array, "first" is a record or "]", "record" a record after a comma,
+    # "separator" a comma or "]", and "end" only whitespace
+    expect = "["
+    final = False
+    chunks = chunks.__aiter__()
+
+    while not final:
+        try:
+            buffer += text.decode(await chunks.__anext__())
+        except StopAsyncIteration:
+            buffer += text.decode(b"", final=True)
+            final = True
+
+        pos = 0
+        while True:
+            pos = _skip(buffer, pos, _WHITESPACE)
+            if pos >= len(buffer):
+                break
+            char = buffer[pos]
+            if expect == "end":
+                raise ValueError("Invalid JSON array: unexpected data after the closing bracket")
+            if expect == "[":
+                if char != "[":
+                    raise ValueError("Expected a JSON array of engagement records")
+                expect = "first"
+                pos += 1
+                continue
+            if expect == "separator":
+                if char not in ",]":
+                    raise ValueError("Invalid JSON array: expected ',' or ']' after a record")
+                expect = "record" if char == "," else "end"
+                pos += 1
+                continue
+            if char in ",]":
+                if char == "]" and expect == "first":
+                    expect = "end"
+                    pos += 1
+                    continue
+                raise ValueError("Invalid JSON array: expected a record")
+            try:
+                record, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if final:
+                    raise ValueError(f"Invalid JSON array: {str(e)}")
+                break
+            # A number or literal is only complete at a delimiter: "12." may still become "12.5e3"
+            if not final and char not in '{["' and (end >= len(buffer) or buffer[end] not in _WHITESPACE + ",]"):
+                break
+            yield record, None
+            expect = "separator"
+            pos = end
+        buffer = buffer[pos:]
+
+    if expect != "end":
+        raise ValueError("Invalid JSON array: unexpected end of body")
+
+
+class BulkIngestor:
+    """Validates engagement records one at a time and writes them in insert_many chunks.
+
+    Search volume is accounted in aggregate: instead of one search_volume
+    document per row, finish() writes one per (topic, day) whose value is the
+    number of rows received for it.
+    """
+
+    def __init__(self, database, client_host=None, chunk_size=None):
+        self.database = database
+        self.client_host = client_host
+        self.chunk_size = chunk_size or settings.INGEST_BULK_CHUNK_SIZE
+        self._chunk = []
+        self._searches = {}
+        self.received = 0
+        self.stored = 0
+        self.rejected = 0
+        self.errors = []
+
+    async def add(self, record, error=None):
+        """Validate one parsed record (or record a parse error) and write the chunk when it is full."""
+        index = self.received
+        self.received += 1
+        if error is None:
+            try:
+                data = TimeSeriesData(**record) if isinstance(record, dict) else None
+                if data is None:
+                    error = "Expected a JSON object"
+            except ValidationError as e:
+                error = str(e)
+        if error is not None:
+            self.rejected += 1
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append({"index": index, "error": error})
+            return
+
+        self._chunk.append(data.dict())
+        search = self._searches.setdefault((data.topic.lower(), day_bucket(data.timestamp)), {"rows": 0, "platforms": set()})
+        search["rows"] += 1
+        search["platforms"].add(data.platform)
+        if len(self._chunk) >= self.chunk_size:
+            await self.flush()
+
+    async def flush(self):
+        chunk, self._chunk = self._chunk, []
+        if chunk:
+            self.stored += len(await self.database.store_engagement_batch(chunk))
+
+    def search_volume_documents(self):
+        return [
+            {
+                "topic": topic,
+                "platform": "search_volume",
+                "timestamp": day,
+                "value": search["rows"],
+                "metadata": {
+                    "source_ip": self.client_host,
+                    "query_platforms": sorted(search["platforms"]),
+                    "bulk": True
+                }
+            }
+            for (topic, day), search in self._searches.items()
+        ]
+
+    async def finish(self):
+        """Write the last chunk and the aggregated search volume; return the ingestion summary."""
+        await self.flush()
+        searches = self.search_volume_documents()
+        for start in range(0, len(searches), self.chunk_size):
+            await self.database.store_engagement_batch(searches[start:start + self.chunk_size])
+        logger.info(
+            f"Bulk ingestion finished: {self.stored} stored, {self.rejected} rejected, "
+            f"{len(searches)} search volume records"
+        )
+        return self.summary()
+
+    def summary(self):
+        return {
+            "received": self.received,
+            "stored": self.stored,
+            "rejected": self.rejected,
+            "errors": self.errors
+        }
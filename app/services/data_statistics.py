@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+
+# Add parent directory to path to find root config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import settings
+
+logger = logging.getLogger("data_statistics")
+
+
+class DataStatistics:
+    """Data statistics (document counts by topic and platform) refreshed in the background.
+
+    Requests are served the last computed snapshot together with its
+    computed_at time, so reading statistics never queries MongoDB. Until the
+    first refresh has finished, get() computes one and waits for it.
+    """
+
+    def __init__(self, database, refresh_seconds=None):
+        self.database = database
+        self.refresh_seconds = refresh_seconds or settings.DATA_STATS_REFRESH_SECONDS
+        self._snapshot = None
+        self._computed_at = None
+        self._last_error = None
+        self._refreshing = None
+        self._task = None
+
+    def start(self):
+        """Start the background refresh task; call from the running event loop."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                pass
+            await asyncio.sleep(self.refresh_seconds)
+
+    async def refresh(self):
+        """Recompute the snapshot; concurrent callers share one computation."""
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._compute())
+            self._refreshing.add_done_callback(lambda _: setattr(self, "_refreshing", None))
+        await asyncio.shield(self._refreshing)
+
+    async def _compute(self):
+        try:
+            self._snapshot = await self.database.get_data_statistics()
+            self._computed_at = datetime.utcnow()
+            self._last_error = None
+            logger.info(f"Refreshed data statistics for {len(self._snapshot['topics'])} topics")
+        except Exception as e:
+            self._last_error = str(e)
+            logger.error(f"Error refreshing data statistics: {str(e)}")
+            raise
+
+    @property
+    def healthy(self):
+        """False when the most recent refresh failed."""
+        return self._last_error is None
+
+    async def get(self):
+        if self._snapshot is None:
+            await self.refresh()
+        return {
+            **self._snapshot,
+            "computed_at": self._computed_at.isoformat(),
+            "refresh_seconds": self.refresh_seconds,
+            "last_error": self._last_error
+        }
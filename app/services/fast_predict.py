@@ -0,0 +1,79 @@
+import logging
+import os
+import sys
+from statistics import NormalDist
+
+import numpy as np
+
+# Add parent directory to path to find root config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import settings
+
+logger = logging.getLogger("fast_predict")
+
+
+def analytic_intervals(model, ds, yhat):
+    """Approximate Prophet's uncertainty interval without Monte Carlo simulation.
+
+    Combines the fitted observation noise (sigma_obs) with the variance of the
+    future trend changes Prophet would simulate: changepoints arrive at the
+    historical rate and shift the slope by Laplace(0, mean |delta|), which gives
+    a trend variance growing with the cube of the distance past the history.
+    """
+    ds = np.asarray(ds, dtype='datetime64[ns]')
+    t = (ds - model.start.to_datetime64()).astype('int64') / float(model.t_scale.value)
+    horizon = np.clip(t - 1.0, 0.0, None)
+
+    sigma_obs = float(np.nanmean(model.params['sigma_obs']))
+    deltas = np.nanmean(model.params['delta'], axis=0)
+    changepoint_rate = float(len(model.changepoints_t))
+    laplace_scale = float(np.mean(np.abs(deltas))) + 1e-8
+
+    trend_var = 2.0 * changepoint_rate * laplace_scale ** 2 * horizon ** 3 / 3.0
+    sd = model.y_scale * np.sqrt(sigma_obs ** 2 + trend_var)
+
+    z = NormalDist().inv_cdf(0.5 + model.interval_width / 2.0)
+    yhat = np.asarray(yhat, dtype=float)
+    return yhat - z * sd, yhat + z * sd
+
+
+def sampled_intervals(model, ds):
+    """Prophet's own Monte Carlo uncertainty interval, simulated for the dates ds only.
+
+    The same simulation Prophet.predict runs, without predicting the history.
+    Returns (lower, upper), or None when the model has no uncertainty samples.
+    """
+    import pandas as pd
+
+    if not model.uncertainty_samples:
+        return None
+    df = model.setup_dataframe(pd.DataFrame({'ds': pd.DatetimeIndex(ds)}))
+    intervals = model.predict_uncertainty(df, vectorized=True)
+    return intervals['yhat_lower'].values, intervals['yhat_upper'].values
+
+
+def predict_fast(model, periods, frequency='D'):
+    """Predict only the future rows of a fitted model, with cheap uncertainty bands.
+
+    Uses FAST_PREDICT_UNCERTAINTY_SAMPLES seeded simulations, or the analytic
+    interval approximation when that setting is 0. Returns a DataFrame with
+    ds, yhat, yhat_lower and yhat_upper for the forecast horizon only.
+    """
+    future = model.make_future_dataframe(periods=periods, freq=frequency, include_history=False)
+    samples = settings.FAST_PREDICT_UNCERTAINTY_SAMPLES
+
+    original_samples = model.uncertainty_samples
+    try:
+        model.uncertainty_samples = samples
+        if samples:
+            np.random.seed(settings.FAST_PREDICT_SEED)
+        forecast = model.predict(future)
+    finally:
+        model.uncertainty_samples = original_samples
+
+    if not samples:
+        lower, upper = analytic_intervals(model, forecast['ds'], forecast['yhat'].values)
+        forecast['yhat_lower'] = lower
+        forecast['yhat_upper'] = upper
+
+    return forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
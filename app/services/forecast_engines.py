@@ -0,0 +1,166 @@
+import logging
+from statistics import NormalDist
+
+import numpy as np
+
+logger = logging.getLogger("forecast_engines")
+
+# Seasonal period (in observations) for each forecast frequency
+SEASON_LENGTHS = {'H': 24, 'D': 7, 'W': 52, 'M': 12, 'MS': 12}
+
+_ENGINES = {}
+
+
+def register_engine(cls):
+    """Class decorator adding an engine to the registry under cls.name."""
+    _ENGINES[cls.name] = cls()
+    return cls
+
+
+def get_engine(name):
+    engine = _ENGINES.get(name)
+    if engine is None:
+        raise ValueError(f"Unknown forecasting engine: {name}. Available: {', '.join(available_engines())}")
+    return engine
+
+
+def available_engines():
+    return sorted(_ENGINES)
+
+
+def season_length(frequency):
+    return SEASON_LENGTHS.get(frequency.upper(), 1)
+
+
+def future_dates(last_date, periods, frequency='D'):
+    """The horizon Prophet.make_future_dataframe would produce after last_date."""
+    # Imported here so listing engines does not load pandas
+    import pandas as pd
+
+    dates = pd.date_range(start=last_date, periods=periods + 1, freq=frequency)
+    return dates[dates > last_date][:periods]
+
+
+class ForecastingEngine:
+    """Interface for forecasting engines.
+
+    forecast() takes the (ds, y) DataFrame of a series and returns
+    (dates, yhat, yhat_lower, yhat_upper) for the next periods, with dates as a
+    DatetimeIndex and the rest as NumPy arrays. Engines that need more context
+    (the Prophet engine uses the model cache) read it from **options.
+    """
+    name = None
+    interval_width = 0.95
+
+    def forecast(self, df, periods, frequency='D', **options):
+        raise NotImplementedError
+
+    def z_score(self):
+        return NormalDist().inv_cdf(0.5 + self.interval_width / 2.0)
+
+
+@register_engine
+class SeasonalNaiveEngine(ForecastingEngine):
+    """Repeats the last observed season (or the last value when the series is shorter than one season)."""
+    name = 'seasonal_naive'
+
+    def forecast(self, df, periods, frequency='D', **options):
+        y = df['y'].values.astype(float)
+        m = season_length(frequency)
+        if len(y) < 2 * m:
+            m = 1
+
+        h = np.arange(periods)
+        yhat = y[len(y) - m + (h % m)]
+
+        # Residuals of the seasonal naive method on the history; spread grows with full seasons ahead
+        residuals = y[m:] - y[:-m]
+        sigma = float(np.std(residuals)) if len(residuals) > 1 else 0.1 * float(np.abs(y).mean())
+        sd = sigma * np.sqrt(h // m + 1)
+        z = self.z_score()
+        dates = future_dates(df['ds'].iloc[-1], periods, frequency)
+        return dates, yhat, yhat - z * sd, yhat + z * sd
+
+
+class ExponentialSmoothingEngine(ForecastingEngine):
+    """Additive exponential smoothing (ETS) fitted by a grid search vectorized over parameters.
+
+    The smoothing recursion runs once over the series for every parameter
+    combination at the same time, and the combination with the lowest one-step
+    squared error is used to forecast.
+    """
+    alphas = np.array([0.1, 0.2, 0.3, 0.5, 0.7, 0.9])
+    betas = np.array([0.01, 0.05, 0.1, 0.2, 0.3])
+    gammas = np.array([0.0])
+    phis = np.array([1.0])
+    seasonal = False
+
+    def forecast(self, df, periods, frequency='D', **options):
+        y = df['y'].values.astype(float)
+        n = len(y)
+        m = season_length(frequency) if self.seasonal else 1
+        if n < 2 * m:
+            m = 1
+
+        grid = np.array(np.meshgrid(
+            self.alphas, self.betas, self.gammas if m > 1 else np.array([0.0]), self.phis
+        )).reshape(4, -1)
+        alpha, beta, gamma, phi = grid
+
+        # Initial states
+        if m > 1:
+            level0 = y[:m].mean()
+            trend0 = (y[m:2 * m].mean() - y[:m].mean()) / m
+            season0 = y[:m] - level0
+        else:
+            level0 = y[0]
+            trend0 = y[1] - y[0] if n > 1 else 0.0
+            season0 = np.zeros(1)
+
+        size = grid.shape[1]
+        level = np.full(size, level0)
+        trend = np.full(size, trend0)
+        season = np.tile(season0, (size, 1))
+        sse = np.zeros(size)
+
+        for t in range(n):
+            s = season[:, t % m]
+            prediction = level + phi * trend + s
+            sse += (y[t] - prediction) ** 2
+            new_level = alpha * (y[t] - s) + (1 - alpha) * (level + phi * trend)
+            trend = beta * (new_level - level) + (1 - beta) * phi * trend
+            if m > 1:
+                season[:, t % m] = gamma * (y[t] - new_level) + (1 - gamma) * s
+            level = new_level
+
+        best = int(np.argmin(sse))
+        a, b, g, p = alpha[best], beta[best], gamma[best], phi[best]
+        sigma = float(np.sqrt(sse[best] / n))
+
+        h = np.arange(1, periods + 1)
+        damped = np.cumsum(p ** h)
+        yhat = level[best] + damped * trend[best] + season[best][(n + h - 1) % m]
+
+        # ETS(A,Ad,A) forecast variance: sigma^2 * (1 + sum of c_j^2 for j < h)
+        c = a * (1 + b * damped) + g * ((h % m) == 0)
+        c_squared = np.concatenate([[0.0], np.cumsum(c[:-1] ** 2)])
+        sd = sigma * np.sqrt(1 + c_squared)
+
+        z = self.z_score()
+        dates = future_dates(df['ds'].iloc[-1], periods, frequency)
+        return dates, yhat, yhat - z * sd, yhat + z * sd
+
+
+@register_engine
+class HoltWintersEngine(ExponentialSmoothingEngine):
+    """Holt-Winters additive level, trend and season (ETS(A,A,A))."""
+    name = 'holt_winters'
+    gammas = np.array([0.01, 0.1, 0.3])
+    seasonal = True
+
+
+@register_engine
+class DampedTrendEngine(ExponentialSmoothingEngine):
+    """Holt's damped trend without seasonality (ETS(A,Ad,N))."""
+    name = 'damped_trend'
+    phis = np.array([0.8, 0.85, 0.9, 0.95, 0.98])
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Add parent directory to path to find root config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import settings
+
+logger = logging.getLogger("forecast_executor")
+
+# Per-process ProphetService, created by the pool initializer inside each worker
+_worker_service = None
+
+
+class ForecastQueueFull(Exception):
+    """Raised when the forecast pool already has the maximum number of jobs waiting."""
+
+
+def _warmup_fit():
+    """Run a tiny fit so the CmdStan model is loaded before the first real request."""
+    import pandas as pd
+    from prophet import Prophet
+
+    df = pd.DataFrame({
+        'ds': pd.date_range('2020-01-01', periods=10, freq='D'),
+        'y': [float(i) for i in range(10)]
+    })
+    Prophet(
+        daily_seasonality=False,
+        weekly_seasonality=False,
+        yearly_seasonality=False,
+        uncertainty_samples=0
+    ).fit(df)
+
+
+def _init_worker(ready_queue=None):
+    """Pool initializer: import Prophet, load CmdStan and create the worker's ProphetService.
+
+    Series are loaded by the caller and passed in, so workers open no database
+    connection. When done, the worker puts its pid on ready_queue.
+    """
+    global _worker_service
+    from .prophet_service import ProphetService
+
+    started = time.time()
+    _worker_service = ProphetService()
+    if settings.FORECAST_POOL_WARMUP:
+        try:
+            _warmup_fit()
+        except Exception as e:
+            logger.error(f"Forecast worker warmup failed: {str(e)}")
+    logger.info(f"Forecast worker {os.getpid()} ready in {time.time() - started:.2f}s")
+    if ready_queue is not None:
+        ready_queue.put(os.getpid())
+
+
+def _ping():
+    return os.getpid()
+
+
+def run_series_forecast_job(topic, platform, daily_data, periods=7, frequency='D', fast_predict=False, engine=None,
+                            tz=None):
+    """Pool job: forecast a series that was already loaded by the caller."""
+    return _worker_service.forecast_daily_series(
+        topic=topic,
+        platform=platform,
+        daily_data=daily_data,
+        periods=periods,
+        frequency=frequency,
+        fast_predict=fast_predict,
+        engine=engine,
+        tz=tz
+    )
+
+
+class ForecastExecutor:
+    """Runs forecast jobs in a bounded pool of pre-warmed worker processes.
+
+    Fits are synchronous and CPU bound, so they are kept off the event loop;
+    `submit` awaits the result with a per-job timeout.
+    """
+
+    def __init__(self, max_workers=None, job_timeout=None, max_queue=None):
+        self.max_workers = max_workers or settings.FORECAST_POOL_SIZE or os.cpu_count() or 1
+        self.job_timeout = job_timeout or settings.FORECAST_JOB_TIMEOUT
+        self.max_queue = settings.FORECAST_POOL_MAX_QUEUE if max_queue is None else max_queue
+        self._pool = None
+        self._lock = threading.Lock()
+        self._ready_queue = None
+        self._ready_pids = set()
+        self._started_at = None
+        self._ready_seconds = None
+        # Jobs submitted to the pool and not yet finished, including ones whose caller timed out
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._timed_out = 0
+        self._rejected = 0
+        self._total_seconds = 0.0
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                context = multiprocessing.get_context(settings.FORECAST_POOL_START_METHOD)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self._ready_queue,)
+                )
+                logger.info(f"Started forecast process pool with {self.max_workers} workers")
+            return self._pool
+
+    def _reset_pool(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def start(self):
+        """Create the pool and spawn every worker so warmup happens in the background before traffic arrives.
+
+        Returns immediately; `ready` turns true once max_workers distinct
+        workers have finished the initializer (import + CmdStan fit). A single
+        fast worker could answer every ping, so readiness is counted by the
+        pids the workers report themselves.
+        """
+        self._started_at = time.time()
+        self._ready_queue = multiprocessing.get_context(settings.FORECAST_POOL_START_METHOD).Queue()
+        pool = self._get_pool()
+        # One ping per worker makes the pool spawn all of them now
+        for _ in range(self.max_workers):
+            pool.submit(_ping)
+        threading.Thread(target=self._wait_ready, name="forecast-pool-ready", daemon=True).start()
+
+    def _wait_ready(self):
+        while len(self._ready_pids) < self.max_workers:
+            self._ready_pids.add(self._ready_queue.get())
+        self._ready_seconds = time.time() - self._started_at
+        logger.info(f"Forecast pool warm after {self._ready_seconds:.2f}s")
+
+    @property
+    def ready(self):
+        """True once start() was called and every worker has reported that its warmup finished."""
+        return self._ready_seconds is not None
+
+    def shutdown(self, wait=False):
+        """Stop the pool, dropping queued jobs.
+
+        By default this returns at once, so it can be called from the event
+        loop: running fits are not waited for (they cannot be interrupted).
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            logger.info("Shutting down forecast process pool")
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    async def submit(self, fn, *args, timeout=None):
+        """Run fn(*args) in the pool and await its result.
+
+        Raises ForecastQueueFull when too many jobs are waiting and
+        asyncio.TimeoutError when the job does not finish in time.
+        """
+        if self.max_queue and self._in_flight >= self.max_workers + self.max_queue:
+            self._rejected += 1
+            raise ForecastQueueFull(f"Forecast queue is full ({self._in_flight} jobs in flight)")
+
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BrokenProcessPool:
+            logger.error("Forecast process pool is broken, restarting it")
+            self._reset_pool()
+            future = self._get_pool().submit(fn, *args)
+
+        with self._in_flight_lock:
+            self._in_flight += 1
+        # Counted down when the job really ends, not when the caller stops waiting for it
+        future.add_done_callback(self._job_done)
+        self._submitted += 1
+        started = time.time()
+        try:
+            result = await asyncio.wait_for(
+                asyncio.wrap_future(future),
+                timeout=timeout or self.job_timeout
+            )
+            self._completed += 1
+            return result
+        except asyncio.TimeoutError:
+            # A job that is already running cannot be interrupted; it finishes in the background
+            future.cancel()
+            self._timed_out += 1
+            logger.error(f"Forecast job timed out after {timeout or self.job_timeout}s")
+            raise
+        except BrokenProcessPool:
+            self._failed += 1
+            self._reset_pool()
+            raise
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._total_seconds += time.time() - started
+
+    def _job_done(self, future):
+        # Runs on the pool's management thread (or right away when cancelled)
+        with self._in_flight_lock:
+            self._in_flight -= 1
+
+    def metrics(self):
+        finished = self._completed + self._failed + self._timed_out
+        return {
+            "ready": self.ready,
+            "ready_seconds": round(self._ready_seconds, 3) if self._ready_seconds is not None else None,
+            "max_workers": self.max_workers,
+            "ready_workers": len(self._ready_pids),
+            "in_flight": self._in_flight,
+            "queue_depth": max(0, self._in_flight - self.max_workers),
+            "max_queue": self.max_queue,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "timed_out": self._timed_out,
+            "rejected": self._rejected,
+            "avg_job_seconds": round(self._total_seconds / finished, 4) if finished else 0.0
+        }
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import deque
+
+# Add parent directory to path to find root config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import settings
+from ..database.db import timeseries_storage
+
+logger = logging.getLogger("ingestion_buffer")
+
+
+class IngestionBufferFull(Exception):
+    """Raised when accepting more documents would exceed INGEST_MAX_PENDING."""
+
+
+class IngestionBuffer:
+    """Write-behind buffer for engagement documents.
+
+    Requests add documents and return straight away; a background task writes
+    them with one unordered insert_many plus one rollup bulk_write whenever
+    batch_size documents are waiting or flush_interval seconds have passed. At
+    most max_pending documents are held (queued or awaiting their rollup);
+    beyond that submit() raises IngestionBufferFull.
+
+    The two writes are retried separately. When the insert fails, the batch
+    goes back to the front of the queue, as far as there is room. Ids are
+    fixed before the first attempt, and the unique _id index makes a retry
+    skip documents an earlier attempt already stored. Time-series collections
+    have no unique _id index, so with ENGAGEMENTS_STORAGE=timeseries a failed
+    insert is not retried: its documents may have been partly written, and
+    they are counted as failed instead. Documents rejected by the insert
+    itself are counted as failed and not retried. When only the rollup update fails, the stored documents wait
+    for their rollup and are retried on the next interval, without inserting
+    them again. A partly failed rollup bulk_write only retries the documents
+    of the rows that failed, so applied rows are not incremented twice; after
+    any other error it is unknown which rows were updated, and they are all
+    retried.
+    """
+
+    def __init__(self, database, batch_size=None, flush_interval=None, max_pending=None):
+        self.database = database
+        self.batch_size = batch_size or settings.INGEST_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.INGEST_FLUSH_INTERVAL_SECONDS
+        self.max_pending = max_pending or settings.INGEST_MAX_PENDING
+        self._pending = deque()
+        # Inserted documents whose rollup update has not been applied yet
+        self._unrolled = []
+        self._wakeup = None
+        self._flush_lock = None
+        self._task = None
+        self._accepted = 0
+        self._rejected = 0
+        self._written = 0
+        self._failed = 0
+        self._dropped = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._last_flush_at = None
+        self._last_flush_seconds = None
+
+    def start(self):
+        """Start the background flush task; call from the running event loop."""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.ensure_future(self._run())
+            logger.info(
+                f"Ingestion buffer started (batch {self.batch_size}, interval {self.flush_interval}s, "
+                f"max pending {self.max_pending})"
+            )
+
+    async def stop(self):
+        """Stop the flush task and write everything still pending."""
+        if self._task is None:
+            return
+        # Take the flush lock first so the task is never cancelled halfway through a write
+        async with self._flush_lock:
+            self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while self._pending or self._unrolled:
+            if not await self._flush_once():
+                if self._pending:
+                    logger.error(f"Dropping {len(self._pending)} pending documents at shutdown")
+                    self._dropped += len(self._pending)
+                    self._pending.clear()
+                if self._unrolled:
+                    logger.error(
+                        f"{len(self._unrolled)} stored documents are missing from engagements_daily; "
+                        f"rebuild it with python -m app.database.rollup"
+                    )
+                    self._unrolled = []
+                break
+        logger.info("Ingestion buffer stopped")
+
+    def _held(self):
+        return len(self._pending) + len(self._unrolled)
+
+    def submit(self, documents):
+        """Queue documents for the next flush. All or none are accepted."""
+        if self._held() + len(documents) > self.max_pending:
+            self._rejected += len(documents)
+            raise IngestionBufferFull(f"Ingestion buffer is full ({len(self._pending)} documents pending)")
+        self._pending.extend(documents)
+        self._accepted += len(documents)
+        if len(self._pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Drain full batches right away; a partial batch waits for the next interval
+            while self._pending or self._unrolled:
+                if not await self._flush_once() or len(self._pending) < self.batch_size:
+                    break
+
+    async def _flush_once(self):
+        """Flush one batch; False when the write failed and the batch was requeued."""
+        failed_flushes = self._failed_flushes
+        await self.flush()
+        return self._failed_flushes == failed_flushes
+
+    async def flush(self):
+        """Write up to batch_size pending documents and any outstanding rollup updates; returns how many were inserted."""
+        async with self._flush_lock:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            if not batch and not self._unrolled:
+                return 0
+
+            started = time.time()
+            written = []
+            if batch:
+                try:
+                    written = await self.database.insert_engagements(batch)
+                except Exception as e:
+                    self._failed_flushes += 1
+                    if timeseries_storage():
+                        # Nothing stops a retry from storing the part that was written a second time
+                        self._failed += len(batch)
+                        logger.error(f"Ingestion flush of {len(batch)} documents failed, not retried: {str(e)}")
+                        return 0
+                    # Requeue in original order ahead of newer documents, keeping the memory bound
+                    room = max(0, self.max_pending - self._held())
+                    if room < len(batch):
+                        self._dropped += len(batch) - room
+                        logger.error(f"Dropping {len(batch) - room} documents after failed flush")
+                    self._pending.extendleft(reversed(batch[:room]))
+                    logger.error(f"Ingestion flush of {len(batch)} documents failed: {str(e)}")
+                    return 0
+                self._written += len(written)
+                self._failed += len(batch) - len(written)
+
+            self._unrolled.extend(written)
+            try:
+                # Rows the bulk_write did update are applied; only the failed ones are retried
+                self._unrolled = await self.database.apply_rollup(self._unrolled)
+            except Exception as e:
+                self._failed_flushes += 1
+                logger.error(f"Rollup update for {len(self._unrolled)} stored documents failed, will retry: {str(e)}")
+                return len(written)
+            if self._unrolled:
+                self._failed_flushes += 1
+                logger.error(f"Rollup update for {len(self._unrolled)} stored documents failed, will retry")
+                return len(written)
+
+            self._flushes += 1
+            self._last_flush_at = time.time()
+            self._last_flush_seconds = self._last_flush_at - started
+            return len(written)
+
+    def metrics(self):
+        return {
+            "pending": len(self._pending),
+            "awaiting_rollup": len(self._unrolled),
+            "max_pending": self.max_pending,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "accepted": self._accepted,
+            "rejected": self._rejected,
+            "written": self._written,
+            "failed": self._failed,
+            "dropped": self._dropped,
+            "flushes": self._flushes,
+            "failed_flushes": self._failed_flushes,
+            "avg_batch_size": round(self._written / self._flushes, 1) if self._flushes else 0.0,
+            "last_flush_seconds": round(self._last_flush_seconds, 4) if self._last_flush_seconds is not None else None,
+            "seconds_since_flush": round(time.time() - self._last_flush_at, 1) if self._last_flush_at else None
+        }
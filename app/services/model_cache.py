@@ -0,0 +1,197 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+# Add parent directory to path to find root config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import settings
+from ..database.db import is_utc
+
+logger = logging.getLogger("model_cache")
+
+
+def series_fingerprint(df):
+    """Fingerprint a daily series: row count + last date + checksum of (ds, y)."""
+    if df.empty:
+        return "0"
+    ds = df['ds'].values.astype('datetime64[ns]')
+    y = df['y'].values.astype('float64')
+    checksum = hashlib.sha1(ds.tobytes() + y.tobytes()).hexdigest()
+    last_date = str(ds[-1])
+    return f"{len(df)}:{last_date}:{checksum}"
+
+
+def series_key(topic, platform, model_config, frequency='D', tz=None, window=None):
+    """Stable cache key for a topic/platform, how its series was loaded and the Prophet configuration used to fit it.
+
+    The series is loaded as frequency buckets in timezone tz, limited to a
+    training window (None for all history).
+    """
+    key = {"topic": topic, "platform": platform, "config": model_config}
+    # Keys of daily UTC series over all history are left as they were so existing cache files stay valid
+    if frequency != 'D':
+        key["frequency"] = frequency
+    if not is_utc(tz):
+        key["timezone"] = tz
+    if window is not None:
+        key["window"] = list(window)
+    raw = json.dumps(
+        key,
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ModelCache:
+    """Cache of fitted Prophet models, persisted as JSON files in MODEL_CACHE_DIR.
+
+    One file is kept per series key; a model is only reused when the stored
+    fingerprint matches the fingerprint of the series being forecast. Recently
+    used models are also kept deserialized in memory. After each write the
+    directory is pruned, oldest files first, to max_files files and max_bytes
+    bytes.
+    """
+
+    def __init__(self, cache_dir=None, memory_items=None, max_files=None, max_bytes=None):
+        self.cache_dir = cache_dir or settings.MODEL_CACHE_DIR
+        self.memory_items = settings.MODEL_CACHE_MEMORY_ITEMS if memory_items is None else memory_items
+        self.max_files = settings.MODEL_CACHE_MAX_FILES if max_files is None else max_files
+        self.max_bytes = settings.MODEL_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        logger.info(f"Model cache using directory: {self.cache_dir}")
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _remember(self, key, fingerprint, created_at, model):
+        with self._lock:
+            self._memory[key] = (fingerprint, created_at, model)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _from_memory(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            return entry
+
+    def _read_payload(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading cached model {path}: {str(e)}")
+            return None
+
+    def _deserialize(self, key, payload):
+        from prophet.serialize import model_from_json
+        try:
+            model = model_from_json(payload["model"])
+            created_at = datetime.fromisoformat(payload["created_at"])
+            self._remember(key, payload["fingerprint"], created_at, model)
+            return model, created_at
+        except Exception as e:
+            logger.error(f"Error loading cached model for key {key}: {str(e)}")
+            return None
+
+    def get(self, key, fingerprint):
+        """Return the cached model for key if it was fitted on the same series, else None."""
+        entry = self._from_memory(key)
+        if entry is not None and entry[0] == fingerprint:
+            logger.info(f"Model cache hit (memory) for key: {key}")
+            return entry[2]
+
+        payload = self._read_payload(key)
+        if payload is None:
+            return None
+        if payload.get("fingerprint") != fingerprint:
+            logger.info(f"Model cache stale for key: {key}")
+            return None
+
+        loaded = self._deserialize(key, payload)
+        if loaded is None:
+            return None
+        logger.info(f"Model cache hit (disk) for key: {key}")
+        return loaded[0]
+
+    def get_latest(self, key):
+        """Return (model, created_at) for the most recent fit stored for key, whatever series it was fitted on."""
+        entry = self._from_memory(key)
+        if entry is not None:
+            return entry[2], entry[1]
+        payload = self._read_payload(key)
+        if payload is None:
+            return None
+        return self._deserialize(key, payload)
+
+    def put(self, key, fingerprint, model):
+        """Serialize a fitted model to the cache directory, replacing any older fit for key."""
+        from prophet.serialize import model_to_json
+        try:
+            created_at = datetime.utcnow()
+            payload = {
+                "fingerprint": fingerprint,
+                "created_at": created_at.isoformat(),
+                "model": model_to_json(model)
+            }
+            # Write to a temp file first so concurrent readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(payload, f)
+                os.replace(tmp_path, self._path(key))
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._remember(key, fingerprint, created_at, model)
+            logger.info(f"Cached fitted model for key: {key}")
+            self.prune()
+        except Exception as e:
+            logger.error(f"Error caching model for key {key}: {str(e)}")
+
+    def prune(self):
+        """Delete the least recently written model files until the directory is within max_files and max_bytes."""
+        if not self.max_files and not self.max_bytes:
+            return 0
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+
+        count = len(files)
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in files:
+            if (not self.max_files or count <= self.max_files) and (not self.max_bytes or total <= self.max_bytes):
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another worker pruned it first
+                pass
+            count -= 1
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} cached models ({count} files, {total} bytes left)")
+        return removed
@@ -0,0 +1,90 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("numpy_predictor")
+
+NS_PER_DAY = 24 * 3600 * 1e9
+
+
+class UnsupportedModel(Exception):
+    """Raised when a fitted model uses features the NumPy predictor does not evaluate."""
+
+
+class NumpyPredictor:
+    """Point forecasts from a fitted Prophet model's parameters, without Prophet.predict.
+
+    Evaluates the piecewise-linear (or flat) trend with its changepoint deltas
+    and the Fourier seasonality terms directly on datetime64 arrays. Models with
+    logistic growth, holidays, extra regressors or conditional seasonalities
+    are rejected with UnsupportedModel so callers can fall back to Prophet.
+    """
+
+    def __init__(self, model):
+        if model.growth not in ('linear', 'flat'):
+            raise UnsupportedModel(f"Unsupported growth: {model.growth}")
+        if model.extra_regressors:
+            raise UnsupportedModel("Extra regressors are not supported")
+        if model.train_holiday_names is not None and len(model.train_holiday_names) > 0:
+            raise UnsupportedModel("Holidays are not supported")
+        if any(props.get('condition_name') for props in model.seasonalities.values()):
+            raise UnsupportedModel("Conditional seasonalities are not supported")
+
+        self.growth = model.growth
+        self.start = model.start.to_datetime64().astype('datetime64[ns]')
+        self.t_scale = float(model.t_scale.value)
+        self.y_scale = float(model.y_scale)
+        self.changepoints_t = np.asarray(model.changepoints_t, dtype=float)
+
+        # MAP fits store one row per parameter; average in case of MCMC samples, as Prophet does
+        self.k = float(np.nanmean(model.params['k']))
+        self.m = float(np.nanmean(model.params['m']))
+        self.deltas = np.nanmean(model.params['delta'], axis=0)
+        beta = np.nanmean(model.params['beta'], axis=0)
+
+        # Columns of beta follow the order Prophet builds seasonal features in
+        self.seasonalities = []
+        offset = 0
+        for props in model.seasonalities.values():
+            width = 2 * props['fourier_order']
+            self.seasonalities.append((
+                float(props['period']),
+                props['fourier_order'],
+                props['mode'],
+                beta[offset:offset + width]
+            ))
+            offset += width
+
+    def trend(self, t):
+        if self.growth == 'flat':
+            return np.full(t.shape, self.m)
+        # Slope and offset adjustments from every changepoint at or before t
+        active = self.changepoints_t[None, :] <= t[:, None]
+        deltas_t = active * self.deltas
+        k_t = deltas_t.sum(axis=1) + self.k
+        m_t = (deltas_t * -self.changepoints_t).sum(axis=1) + self.m
+        return k_t * t + m_t
+
+    def predict(self, ds):
+        """Return yhat for an array of timestamps."""
+        ds = np.asarray(ds, dtype='datetime64[ns]')
+        ns = ds.astype('int64').astype(float)
+        t = (ns - float(self.start.astype('int64'))) / self.t_scale
+        days = ns / NS_PER_DAY
+
+        additive = np.zeros(len(ds))
+        multiplicative = np.zeros(len(ds))
+        for period, order, mode, beta in self.seasonalities:
+            # Interleaved sin/cos columns, matching Prophet's fourier_series
+            angles = 2.0 * np.pi * np.arange(1, order + 1)[None, :] * days[:, None] / period
+            features = np.empty((len(ds), 2 * order))
+            features[:, 0::2] = np.sin(angles)
+            features[:, 1::2] = np.cos(angles)
+            component = features @ beta
+            if mode == 'additive':
+                additive += component * self.y_scale
+            else:
+                multiplicative += component
+
+        trend = self.trend(t) * self.y_scale
+        return trend * (1 + multiplicative) + additive
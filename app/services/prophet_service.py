@@ -1,129 +1,398 @@
-from prophet import Prophet
-import pandas as pd
+import numpy as np
 import logging
 from datetime import datetime, timedelta
-from typing import Tuple, List
-from ..database.db import Database
+from typing import Tuple, List, NamedTuple, Union
+from ..database.db import Database, DailyArrays, training_window
+from .model_cache import ModelCache, series_fingerprint, series_key
+from .fast_predict import predict_fast, analytic_intervals, sampled_intervals
+from .numpy_predictor import NumpyPredictor, UnsupportedModel
+from .forecast_engines import ForecastingEngine, register_engine, get_engine, future_dates
+from config import settings
 
 logger = logging.getLogger("prophet_service")
 
+# prophet and pandas are imported where they are used: the API process only
+# loads series and hands fits to the forecast workers, so it never pays for them
+
+# Buckets are labelled by their start, so months step by month start ("MS"), not month end
+PANDAS_FREQUENCIES = {'M': 'MS'}
+
+def pandas_frequency(frequency):
+    """The pandas offset alias whose dates line up with the database buckets of frequency."""
+    frequency = (frequency or 'D').upper()
+    return PANDAS_FREQUENCIES.get(frequency, frequency)
+
+def date_format(frequency):
+    """strftime format for forecast and history dates; sub-daily series keep the time."""
+    return '%Y-%m-%dT%H:%M:%S' if pandas_frequency(frequency) == 'H' else '%Y-%m-%d'
+
+class SeriesData(NamedTuple):
+    """Everything a forecast needs from the database for one series.
+
+    daily_data is a DailyArrays (or, from older callers, a list of
+    {"ds", "y"} rows) bucketed by the forecast frequency.
+    """
+    daily_data: Union[DailyArrays, List[dict]]
+
+@register_engine
+class ProphetEngine(ForecastingEngine):
+    """Prophet fit through ProphetService (model cache, warm starts, NumPy predict)."""
+    name = 'prophet'
+
+    def forecast(self, df, periods, frequency='D', **options):
+        return options['service'].forecast_prophet(
+            df,
+            options.get('topic'),
+            options.get('platform'),
+            periods,
+            frequency,
+            options.get('fast_predict', False),
+            options.get('tz')
+        )
+
 class ProphetService:
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db=None, async_db=None):
+        # Forecast worker processes never touch the database, so connect lazily
+        self._db = db
+        self.async_db = async_db
+        self.model_cache = ModelCache() if settings.MODEL_CACHE_ENABLED else None
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = Database()
+        return self._db
+
+    def load_series(self, topic, platform=None, frequency='D', tz=None, periods=None):
+        """Load a series bucketed by frequency with one aggregation.
+
+        Only the training window for a forecast of periods is loaded (see TRAINING_WINDOW).
+        """
+        try:
+            return SeriesData(self.db.get_series_arrays(topic, platform, frequency, tz, periods))
+        except Exception as e:
+            logger.error(f"Error loading series: {str(e)}")
+            raise
+
+    async def load_series_async(self, topic, platform=None, frequency='D', tz=None, periods=None):
+        """load_series through the async database, for callers running on the event loop."""
+        try:
+            return SeriesData(await self.async_db.get_series_arrays(topic, platform, frequency, tz, periods))
+        except Exception as e:
+            logger.error(f"Error loading series: {str(e)}")
+            raise
 
     def prepare_data(self, topic, platform=None):
         """Prepare data for Prophet model."""
         try:
             # Get aggregated daily data
-            daily_data = self.db.get_aggregated_daily_data(topic, platform)
+            daily_data = self.db.get_daily_series_arrays(topic, platform)
             
             logger.info(f"Preparing data for Prophet: {len(daily_data)} data points")
             
-            # Debug the structure of the first item to understand the issue
-            if daily_data and len(daily_data) > 0:
-                logger.info(f"Data structure: {daily_data[0]}")
-            
-            # Create proper DataFrame structure for Prophet
-            # Fix: Handle both possible structures from MongoDB
-            df = pd.DataFrame([
-                {'ds': d['ds'] if 'ds' in d else d.get('_id', {}).get('date'),
-                 'y': d['y']}
-                for d in daily_data
-            ])
-            
-            # Ensure ds is in datetime format
-            if 'ds' in df.columns and df['ds'].dtype == 'object':
-                df['ds'] = pd.to_datetime(df['ds'])
-                
-            return df
+            return self.build_dataframe(daily_data)
         except Exception as e:
             logger.error(f"Error preparing data: {str(e)}")
             raise
 
-    def make_forecast(self, topic, platform=None, periods=7, frequency='D'):
-        """Generate a forecast for the given topic and platform."""
+    def build_dataframe(self, daily_data):
+        """Build the Prophet (ds, y) DataFrame from DailyArrays or aggregated daily rows."""
+        import pandas as pd
+        
+        if isinstance(daily_data, DailyArrays):
+            # Already datetime64/float64 columns: no per-row dicts or date parsing
+            return pd.DataFrame({'ds': daily_data.ds, 'y': daily_data.y})
+        
+        # Create proper DataFrame structure for Prophet
+        # Fix: Handle both possible structures from MongoDB
+        df = pd.DataFrame([
+            {'ds': d['ds'] if 'ds' in d else d.get('_id', {}).get('date'),
+             'y': d['y']}
+            for d in daily_data
+        ])
+        
+        # Ensure ds is in datetime format
+        if 'ds' in df.columns and df['ds'].dtype == 'object':
+            df['ds'] = pd.to_datetime(df['ds'])
+            
+        return df
+
+    def make_forecast(self, topic, platform=None, periods=7, frequency='D', fast_predict=False, engine=None, tz=None):
+        """Generate a forecast for the given topic and platform, fitted on buckets of the forecast frequency."""
         try:
             logger.info(f"Making forecast for topic: {topic}, platform: {platform}, periods: {periods}")
             
+            series = self.load_series(topic, platform, frequency, tz, periods)
+            return self.forecast_daily_series(
+                topic,
+                platform,
+                series.daily_data,
+                periods,
+                frequency,
+                fast_predict,
+                engine,
+                tz
+            )
+        except Exception as e:
+            logger.error(f"Error generating forecast: {str(e)}")
+            raise
+
+    def forecast_daily_series(self, topic, platform, daily_data, periods=7, frequency='D', fast_predict=False,
+                              engine=None, tz=None):
+        """Generate a forecast from an already loaded series of frequency buckets in timezone tz."""
+        try:
+            logger.info(f"Making forecast from loaded series for topic: {topic}, platform: {platform}, periods: {periods}")
+
             # If we don't have enough data, use a different approach
-            historical_data = self.db.get_historical_data(topic, platform)
-            
-            if len(historical_data) < 2:
-                logger.warning("Not enough historical data points for standard forecasting. Using simplified approach.")
-                return self.make_simple_forecast(historical_data, periods)
-            
-            # Prepare data for Prophet
-            df = self.prepare_data(topic, platform)
-            
-            if df.empty or len(df) < 2:
-                logger.warning(f"Insufficient data for forecast: only {len(df) if not df.empty else 0} points")
-                return self.make_simple_forecast(historical_data, periods)
-            
-            # Initialize and fit Prophet model
-            model = Prophet(
-                daily_seasonality=False,
-                weekly_seasonality=True if len(df) >= 7 else False,
-                yearly_seasonality=False,
-                seasonality_mode='additive',
-                interval_width=0.95
+            if len(daily_data) < 2:
+                logger.warning(f"Insufficient data for forecast: only {len(daily_data)} daily points. Using simplified approach.")
+                return self.make_simple_forecast(daily_data, periods, frequency)
+
+            df = self.build_dataframe(daily_data)
+            return self.forecast_dataframe(df, topic, platform, periods, frequency, fast_predict, engine, tz)
+        except Exception as e:
+            logger.error(f"Error generating forecast: {str(e)}")
+            raise
+
+    def select_engine(self, engine, n_points):
+        """Resolve the requested engine name, choosing by series length for 'auto'."""
+        engine = engine or settings.FORECAST_ENGINE
+        if engine != 'auto':
+            return engine
+        if n_points < settings.AUTO_ENGINE_NAIVE_MAX_POINTS:
+            return 'seasonal_naive'
+        if n_points < settings.AUTO_ENGINE_PROPHET_MIN_POINTS:
+            return 'holt_winters'
+        return 'prophet'
+
+    def forecast_dataframe(self, df, topic, platform=None, periods=7, frequency='D', fast_predict=False, engine=None,
+                           tz=None):
+        """Forecast the next periods of df with the selected forecasting engine."""
+        frequency = pandas_frequency(frequency)
+        engine_name = self.select_engine(engine, len(df))
+        logger.info(f"Using {engine_name} engine for {len(df)} points")
+        
+        dates, yhat, yhat_lower, yhat_upper = get_engine(engine_name).forecast(
+            df,
+            periods,
+            frequency,
+            service=self,
+            topic=topic,
+            platform=platform,
+            fast_predict=fast_predict,
+            tz=tz
+        )
+
+        # Extract forecast components
+        forecast_dates = dates.strftime(date_format(frequency)).tolist()
+        forecast_values = yhat.tolist()
+        lower_bounds = yhat_lower.tolist()
+        upper_bounds = yhat_upper.tolist()
+
+        # Extract historical data
+        historical_dates = df['ds'].dt.strftime(date_format(frequency)).tolist()
+        historical_values = df['y'].tolist()
+
+        logger.info(f"Forecast generated successfully with {len(forecast_dates)} points")
+
+        return (
+            forecast_dates,
+            forecast_values,
+            lower_bounds,
+            upper_bounds,
+            historical_dates,
+            historical_values
+        )
+
+    def forecast_prophet(self, df, topic, platform=None, periods=7, frequency='D', fast_predict=False, tz=None):
+        """Fit (or reuse) a Prophet model for df and predict the next periods.
+        
+        With fast_predict only the future rows are predicted and the uncertainty
+        bands come from a few seeded samples or an analytic approximation. A
+        model reused from the cache is evaluated with NumpyPredictor instead of
+        Prophet.predict; its bands are still Prophet's simulated ones unless
+        fast_predict is set, so a cache hit does not change what the bands mean.
+        """
+        import pandas as pd
+        
+        # Reuse a cached fit when the series has not changed, otherwise fit Prophet
+        model, from_cache = self.get_fitted_model(df, topic, platform, frequency, periods, tz)
+
+        prediction = self.predict_numpy(model, periods, frequency, sampled=not fast_predict) if from_cache else None
+        if prediction is None:
+            if fast_predict:
+                forecast = predict_fast(model, periods, frequency)
+            else:
+                # Create future dataframe
+                future = model.make_future_dataframe(periods=periods, freq=frequency)
+                forecast = model.predict(future)
+            forecast = forecast.tail(periods)
+            prediction = (
+                pd.DatetimeIndex(forecast['ds']),
+                forecast['yhat'].values,
+                forecast['yhat_lower'].values,
+                forecast['yhat_upper'].values
             )
-            
+        return prediction
+
+    def predict_numpy(self, model, periods=7, frequency='D', sampled=False):
+        """Predict the horizon of a fitted model with NumpyPredictor.
+        
+        Bands are analytic, or with sampled Prophet's Monte Carlo simulation run
+        on the horizon only. Returns (dates, yhat, yhat_lower, yhat_upper), or
+        None when the model uses features NumpyPredictor does not evaluate.
+        """
+        try:
+            predictor = NumpyPredictor(model)
+        except UnsupportedModel as e:
+            logger.info(f"Falling back to Prophet.predict: {str(e)}")
+            return None
+        
+        # Same horizon as Prophet.make_future_dataframe
+        dates = future_dates(model.history_dates.max(), periods, frequency)
+        
+        yhat = predictor.predict(dates.values)
+        intervals = sampled_intervals(model, dates) if sampled else None
+        yhat_lower, yhat_upper = intervals or analytic_intervals(model, dates.values, yhat)
+        return dates, yhat, yhat_lower, yhat_upper
+
+    def get_model_config(self, df):
+        """Prophet constructor arguments used for a series.
+        
+        Seasonalities shorter than the spacing of the series are left out:
+        hourly series get a daily seasonality, weekly and monthly ones no weekly.
+        """
+        spacing = df['ds'].diff().median() if len(df) > 1 else timedelta(days=1)
+        span = df['ds'].max() - df['ds'].min() if len(df) else timedelta(0)
+        return {
+            'daily_seasonality': bool(spacing < timedelta(days=1) and span >= timedelta(days=2)),
+            'weekly_seasonality': bool(spacing < timedelta(days=7) and len(df) >= 7),
+            'yearly_seasonality': False,
+            'seasonality_mode': 'additive',
+            'interval_width': 0.95
+        }
+
+    def get_fitted_model(self, df, topic, platform=None, frequency='D', periods=None, tz=None):
+        """Return (model, from_cache): a fitted Prophet model for df, from the model cache when the series is unchanged.
+        
+        Series loaded with a different timezone or training window (which can
+        depend on periods) get their own cache entry, so they do not evict each other.
+        """
+        model_config = self.get_model_config(df)
+        
+        if self.model_cache is None:
+            return self.fit_model(df, model_config), False
+        
+        key = series_key(topic, platform, model_config, frequency, tz, training_window(frequency, periods))
+        fingerprint = series_fingerprint(df)
+        
+        model = self.model_cache.get(key, fingerprint)
+        if model is not None:
+            logger.info(f"Reusing cached model for topic: {topic}, platform: {platform}")
+            return model, True
+        
+        # New data since the last fit: start the optimizer from the previous parameters
+        previous = self.model_cache.get_latest(key) if settings.WARM_START_ENABLED else None
+        model = self.fit_model(df, model_config, previous)
+        self.model_cache.put(key, fingerprint, model)
+        return model, False
+
+    def fit_model(self, df, model_config, previous=None):
+        """Fit Prophet on df, warm-started from previous (model, fitted_at) when it is compatible."""
+        from prophet import Prophet
+        
+        model = Prophet(**model_config)
+        init = self.warm_start_init(model, df, *previous) if previous is not None else None
+        if init is None:
             model.fit(df)
+            return model
+        
+        try:
+            model.fit(df, init=init)
+            logger.info(f"Warm-started fit on {len(df)} points")
+            return model
+        except Exception as e:
+            logger.warning(f"Warm-started fit failed, refitting from scratch: {str(e)}")
+            # A Prophet object can only be fit once
+            model = Prophet(**model_config)
+            model.fit(df)
+            return model
+
+    def warm_start_init(self, model, df, previous, fitted_at):
+        """Stan initial values for model from a previous fit of the same series, or None for a cold fit.
+        
+        The previous fit is only used when it is recent, covers the same history
+        start, and the series grew by at most WARM_START_MAX_GROWTH. Its
+        changepoint count must match the one model will use on df; seasonalities
+        match because the model config is part of the cache key. Parameters are
+        rescaled to the new y and time scales.
+        """
+        try:
+            age_hours = (datetime.utcnow() - fitted_at).total_seconds() / 3600
+            if age_hours > settings.WARM_START_MAX_AGE_HOURS:
+                logger.info(f"Previous fit is stale ({age_hours:.1f}h old), using a cold fit")
+                return None
             
-            # Create future dataframe
-            future = model.make_future_dataframe(periods=periods, freq=frequency)
-            forecast = model.predict(future)
-            
-            # Extract forecast components
-            forecast_dates = forecast['ds'].tail(periods).dt.strftime('%Y-%m-%d').tolist()
-            forecast_values = forecast['yhat'].tail(periods).tolist()
-            lower_bounds = forecast['yhat_lower'].tail(periods).tolist()
-            upper_bounds = forecast['yhat_upper'].tail(periods).tolist()
+            previous_dates = previous.history_dates
+            new_rows = len(df) - len(previous_dates)
+            if df['ds'].min() != previous_dates.min() or new_rows < 0:
+                logger.info("Series history changed since the previous fit, using a cold fit")
+                return None
+            if new_rows > settings.WARM_START_MAX_GROWTH * len(previous_dates):
+                logger.info(f"Series grew by {new_rows} points since the previous fit, using a cold fit")
+                return None
             
-            # Extract historical data
-            historical_dates = df['ds'].dt.strftime('%Y-%m-%d').tolist()
-            historical_values = df['y'].tolist()
+            # Same rule Prophet uses to cap changepoints on short histories
+            hist_size = int(np.floor(len(df) * model.changepoint_range))
+            n_changepoints = max(min(model.n_changepoints, hist_size - 1), 1)
+            deltas = np.nanmean(previous.params['delta'], axis=0)
+            if len(deltas) != n_changepoints:
+                logger.info(f"Changepoints changed ({len(deltas)} -> {n_changepoints}), using a cold fit")
+                return None
             
-            logger.info(f"Forecast generated successfully with {len(forecast_dates)} points")
+            y_scale = float(np.abs(df['y']).max()) or 1.0
+            y_ratio = previous.y_scale / y_scale
+            t_ratio = (df['ds'].max() - df['ds'].min()) / previous.t_scale
             
-            return (
-                forecast_dates,
-                forecast_values,
-                lower_bounds,
-                upper_bounds,
-                historical_dates,
-                historical_values
-            )
+            beta = np.nanmean(previous.params['beta'], axis=0)
+            if previous.seasonality_mode == 'additive':
+                beta = beta * y_ratio
             
+            return {
+                'k': float(np.nanmean(previous.params['k'])) * y_ratio * t_ratio,
+                'm': float(np.nanmean(previous.params['m'])) * y_ratio,
+                'delta': deltas * y_ratio * t_ratio,
+                'beta': beta,
+                'sigma_obs': float(np.nanmean(previous.params['sigma_obs'])) * y_ratio
+            }
         except Exception as e:
-            logger.error(f"Error generating forecast: {str(e)}")
-            raise
+            logger.warning(f"Could not build warm start parameters: {str(e)}")
+            return None
 
-    def make_simple_forecast(self, historical_data, periods=7):
-        """Generate a simple forecast when we don't have enough data for Prophet."""
+    def make_simple_forecast(self, daily_data, periods=7, frequency='D'):
+        """Generate a simple forecast from the buckets of a series too short for Prophet."""
         try:
             # Extract the latest value
-            if not historical_data:
+            if not len(daily_data):
                 return [], [], [], [], [], []
-                
-            latest_value = historical_data[-1]['value']
-            latest_date = datetime.fromisoformat(historical_data[-1]['timestamp'].replace('Z', '+00:00'))
             
-            # Generate forecast dates
-            forecast_dates = [(latest_date + pd.Timedelta(days=i+1)).strftime('%Y-%m-%d') 
-                             for i in range(periods)]
+            df = self.build_dataframe(daily_data)
+            frequency = pandas_frequency(frequency)
+            latest_value = float(df['y'].iloc[-1])
+            
+            # Generate forecast dates: the buckets after the latest one
+            forecast_dates = future_dates(df['ds'].iloc[-1], periods, frequency).strftime(date_format(frequency)).tolist()
             
             # Simple forecast: use the latest value with small variations
-            forecast_values = [latest_value for _ in range(periods)]
+            forecast_values = [latest_value for _ in forecast_dates]
             
             # Add 10% margin for upper/lower bounds
             lower_bounds = [0.9 * v for v in forecast_values]
             upper_bounds = [1.1 * v for v in forecast_values]
             
             # Historical data
-            historical_dates = [datetime.fromisoformat(d['timestamp'].replace('Z', '+00:00')).strftime('%Y-%m-%d') 
-                              for d in historical_data]
-            historical_values = [d['value'] for d in historical_data]
+            historical_dates = df['ds'].dt.strftime(date_format(frequency)).tolist()
+            historical_values = df['y'].tolist()
             
             logger.info(f"Simple forecast generated with {len(forecast_dates)} points")
             
@@ -0,0 +1,77 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Add parent directory to path to find root config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import settings
+
+logger = logging.getLogger("result_cache")
+
+
+class ForecastResultCache:
+    """In-process LRU + TTL cache of forecast results.
+
+    Entries are keyed by (topic, platform, periods, frequency) and remember the
+    series data version they were computed from; a lookup with a newer version
+    drops the entry instead of returning it. Versions are per process (see
+    SeriesVersions), so writes handled by other processes are only picked up
+    once the entry is older than ttl_seconds.
+    """
+
+    def __init__(self, max_items=None, ttl_seconds=None):
+        self.max_items = settings.RESULT_CACHE_MAX_ITEMS if max_items is None else max_items
+        self.ttl_seconds = settings.RESULT_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._evictions = 0
+
+    def get(self, key, version):
+        """Return the cached result for key if it is fresh and was computed at version, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            entry_version, expires_at, result = entry
+            if entry_version != version or expires_at < time.monotonic():
+                del self._entries[key]
+                self._invalidations += 1
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return result
+
+    def put(self, key, version, result):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl_seconds, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self):
+        lookups = self._hits + self._misses
+        return {
+            "size": len(self._entries),
+            "max_items": self.max_items,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self._invalidations,
+            "evictions": self._evictions
+        }
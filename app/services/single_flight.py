@@ -0,0 +1,53 @@
+import asyncio
+import logging
+
+logger = logging.getLogger("single_flight")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key onto one running task.
+
+    The first caller for a key starts the work as its own task; callers that
+    arrive while it is running await that task instead of starting another.
+    The task is shielded, so a caller disconnecting does not cancel the work
+    the other callers are waiting on.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._started = 0
+        self._coalesced = 0
+        self._waiting = 0
+
+    def _finished(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        # Mark the exception as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, key, fn):
+        """Await fn() for key, sharing the result with concurrent callers of the same key."""
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda finished: self._finished(key, finished))
+            self._started += 1
+        else:
+            self._coalesced += 1
+            logger.info(f"Coalescing request onto in-flight forecast for key: {key}")
+
+        self._waiting += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiting -= 1
+
+    def metrics(self):
+        return {
+            "in_flight": len(self._flights),
+            "waiters": self._waiting,
+            "started": self._started,
+            "coalesced": self._coalesced
+        }
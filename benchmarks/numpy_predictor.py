@@ -0,0 +1,74 @@
+"""Compare NumpyPredictor with Prophet.predict for numerical equality and speed.
+
+Usage:
+    python benchmarks/numpy_predictor.py [--days 730] [--periods 30] [--repeat 50]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from prophet import Prophet
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.numpy_predictor import NumpyPredictor
+
+
+def synthetic_series(days, seed=0):
+    rng = np.random.default_rng(seed)
+    ds = pd.date_range('2022-01-01', periods=days, freq='D')
+    t = np.arange(days)
+    trend = 100 + 0.3 * t + np.where(t > days // 2, 0.5 * (t - days // 2), 0)
+    weekly = 15 * np.sin(2 * np.pi * t / 7)
+    return pd.DataFrame({'ds': ds, 'y': trend + weekly + rng.normal(0, 5, days)})
+
+
+def timed(fn, repeat):
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--periods', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+
+    for mode in ('additive', 'multiplicative'):
+        df = synthetic_series(args.days)
+        model = Prophet(
+            daily_seasonality=False,
+            weekly_seasonality=True,
+            yearly_seasonality=args.days >= 730,
+            seasonality_mode=mode,
+            uncertainty_samples=0
+        )
+        model.fit(df)
+        future = model.make_future_dataframe(periods=args.periods, include_history=False)
+        predictor = NumpyPredictor(model)
+
+        expected = model.predict(future)['yhat'].values
+        actual = predictor.predict(future['ds'].values)
+        max_abs_diff = float(np.max(np.abs(expected - actual)))
+
+        prophet_seconds = timed(lambda: model.predict(future), args.repeat)
+        numpy_seconds = timed(lambda: predictor.predict(future['ds'].values), args.repeat)
+
+        print(f"{mode:>14}: max |yhat diff| = {max_abs_diff:.3e}  "
+              f"Prophet.predict = {prophet_seconds * 1000:.2f} ms  "
+              f"NumpyPredictor = {numpy_seconds * 1000:.3f} ms  "
+              f"speedup = {prophet_seconds / numpy_seconds:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
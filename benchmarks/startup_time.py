@@ -0,0 +1,80 @@
+"""Measure service cold start: import time, time until the API answers, and time until it is ready.
+
+Starts uvicorn in a subprocess (MONGODB_URI must point at a reachable server)
+and polls `/` and `/api/v1/ready`.
+
+Usage:
+    python benchmarks/startup_time.py [--port 8765] [--runs 3] [--timeout 180]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = (
+    "import sys, time; started = time.perf_counter(); "
+    "import app.routes.forecast_routes; "
+    "print(time.perf_counter() - started, 'prophet' in sys.modules, 'pandas' in sys.modules)"
+)
+
+
+def measure_import():
+    """Seconds to import the routes module in a fresh interpreter, and whether prophet/pandas were loaded."""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(output[-3]), output[-2] == "True", output[-1] == "True"
+
+
+def wait_for(url, started, timeout, expect_status=200):
+    """Poll url until it returns expect_status; return the seconds since started."""
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == expect_status:
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} not available after {timeout}s")
+
+
+def measure_server(port, timeout):
+    """Start uvicorn and return (seconds until / answers, seconds until /api/v1/ready answers 200)."""
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        serving = wait_for(f"{base}/", started, timeout)
+        ready = wait_for(f"{base}/api/v1/ready", started, timeout)
+        return serving, ready
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=180.0)
+    args = parser.parse_args()
+
+    for run in range(1, args.runs + 1):
+        import_seconds, prophet_loaded, pandas_loaded = measure_import()
+        serving, ready = measure_server(args.port, args.timeout)
+        print(f"run {run}: import = {import_seconds:.2f}s "
+              f"(prophet loaded: {prophet_loaded}, pandas loaded: {pandas_loaded})  "
+              f"serving = {serving:.2f}s  ready = {ready:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
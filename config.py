@@ -4,8 +4,80 @@ import logging
 class Settings(BaseSettings):
     # Expect the MongoDB URI to come from an environment variable
     MONGODB_URI: str
+    # Shared MongoDB client pool (one per process)
+    MONGO_MAX_POOL_SIZE: int = 20
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_IDLE_TIME_MS: int = 60000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 10000
+    MONGO_SOCKET_TIMEOUT_MS: int = 0
+    MONGO_COMPRESSORS: str = "zlib"
+    MONGO_READ_PREFERENCE: str = "primary"
+    MONGO_RETRY_WRITES: bool = True
+    MONGO_APP_NAME: str = "prophet-services"
     MODEL_CACHE_DIR: str = "cache"
+    MODEL_CACHE_ENABLED: bool = True
+    MODEL_CACHE_MEMORY_ITEMS: int = 128
+    # Bound on MODEL_CACHE_DIR; the oldest files are pruned past either limit (0 = no limit)
+    MODEL_CACHE_MAX_FILES: int = 500
+    MODEL_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    # Warm-start refits from the previous fit of a series
+    WARM_START_ENABLED: bool = True
+    WARM_START_MAX_AGE_HOURS: float = 72.0
+    WARM_START_MAX_GROWTH: float = 0.25
     DEBUG: bool = True
+    # Raw engagements storage: "documents" (engagements collection) or "timeseries"
+    # (MongoDB time-series collection, see python -m app.database.timeseries)
+    ENGAGEMENTS_STORAGE: str = "documents"
+    TIMESERIES_COLLECTION: str = "engagements_ts"
+    TIMESERIES_GRANULARITY: str = "hours"
+    # Create missing engagements indexes and log unindexed query shapes at startup
+    ENSURE_INDEXES_ON_STARTUP: bool = True
+    VERIFY_INDEXES_ON_STARTUP: bool = True
+    # Forecast process pool (0 = one worker per CPU)
+    FORECAST_POOL_SIZE: int = 0
+    FORECAST_POOL_MAX_QUEUE: int = 64
+    FORECAST_POOL_START_METHOD: str = "spawn"
+    FORECAST_POOL_WARMUP: bool = True
+    FORECAST_JOB_TIMEOUT: float = 120.0
+    FORECAST_BATCH_MAX_ITEMS: int = 500
+    # Forecasting engine: "auto" picks by series length, or any registered engine name
+    FORECAST_ENGINE: str = "auto"
+    AUTO_ENGINE_NAIVE_MAX_POINTS: int = 14
+    AUTO_ENGINE_PROPHET_MIN_POINTS: int = 60
+    # Fast predict mode (0 samples = analytic interval approximation)
+    FAST_PREDICT_UNCERTAINTY_SAMPLES: int = 0
+    FAST_PREDICT_SEED: int = 0
+    # Forecast result cache (0 items = disabled)
+    RESULT_CACHE_MAX_ITEMS: int = 1024
+    RESULT_CACHE_TTL_SECONDS: float = 300.0
+    # Rolling cache of recent per-(topic, platform) averages (0 items = disabled)
+    RECENT_AVERAGE_TTL_SECONDS: float = 300.0
+    RECENT_AVERAGE_MAX_ITEMS: int = 10000
+    # Write-behind buffer for /store-engagement (disabled = write on every request)
+    INGEST_BUFFER_ENABLED: bool = True
+    INGEST_BATCH_SIZE: int = 500
+    INGEST_FLUSH_INTERVAL_SECONDS: float = 1.0
+    INGEST_MAX_PENDING: int = 50000
+    # /topics/{topic}/history page sizes and NDJSON cursor batch size
+    HISTORY_PAGE_SIZE: int = 1000
+    HISTORY_MAX_PAGE_SIZE: int = 10000
+    HISTORY_STREAM_BATCH_SIZE: int = 1000
+    # Background refresh interval of /statistics
+    DATA_STATS_REFRESH_SECONDS: float = 300.0
+    # How often an unfinished engagements_daily backfill marker is re-read from rollup_state
+    ROLLUP_STATE_REFRESH_SECONDS: float = 60.0
+    # Rows per insert_many in /store-engagements/bulk
+    INGEST_BULK_CHUNK_SIZE: int = 1000
+    # IANA timezone forecast buckets (hours, days, weeks, months) are aligned to
+    AGGREGATION_TIMEZONE: str = "UTC"
+    # History forecasts are fitted on: "all", "days" (last TRAINING_WINDOW_DAYS), "auto"
+    # (a multiple of the horizon) or "downsample" (older history averaged into coarser buckets)
+    TRAINING_WINDOW: str = "all"
+    TRAINING_WINDOW_DAYS: int = 365
+    TRAINING_WINDOW_HORIZON_MULTIPLIER: float = 10.0
+    TRAINING_WINDOW_MIN_DAYS: int = 90
+    TRAINING_DOWNSAMPLE_FREQUENCY: str = "W"
 
     class Config:
         env_file = ".env"
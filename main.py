@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import logging
 import sys
 import os
@@ -27,7 +28,10 @@ try:
     
     # Import the router
     logger.info("Importing forecast router...")
-    from app.routes.forecast_routes import router as forecast_router
+    from app.routes.forecast_routes import router as forecast_router, forecast_executor, db, adb, ingestion_buffer, data_statistics
+    from app.database.indexes import bootstrap_indexes
+    from app.database.client import close_clients
+    from config import settings
     
     app = FastAPI(title="Prophet Forecasting Service")
 
@@ -43,6 +47,62 @@ try:
     # Include router with prefix
     app.include_router(forecast_router, prefix="/api/v1")
 
+    @app.on_event("startup")
+    async def start_forecast_executor():
+        forecast_executor.start()
+
+    @app.on_event("startup")
+    async def connect_async_database():
+        await adb.connect()
+
+    @app.on_event("startup")
+    async def mark_rollup_live():
+        # Forecasts only read engagements_daily once a backfill reaches the first day it was kept live
+        try:
+            await adb.mark_rollup_live()
+        except Exception as e:
+            logger.error(f"Could not record the rollup start: {str(e)}")
+
+    @app.on_event("startup")
+    async def start_ingestion_buffer():
+        if settings.INGEST_BUFFER_ENABLED:
+            ingestion_buffer.start()
+
+    @app.on_event("startup")
+    async def start_data_statistics():
+        data_statistics.start()
+
+    @app.on_event("startup")
+    async def ensure_database_indexes():
+        # Index builds can take minutes on a large collection: run them in a thread so neither
+        # startup nor requests wait for them
+        asyncio.get_event_loop().run_in_executor(
+            None,
+            bootstrap_indexes,
+            db,
+            settings.ENSURE_INDEXES_ON_STARTUP,
+            settings.VERIFY_INDEXES_ON_STARTUP
+        )
+
+    # Shutdown handlers run in registration order: acknowledged writes go first, before the
+    # SIGTERM grace period can run out
+    @app.on_event("shutdown")
+    async def flush_ingestion_buffer():
+        # Write whatever is still buffered before the database clients close
+        await ingestion_buffer.stop()
+
+    @app.on_event("shutdown")
+    async def stop_forecast_executor():
+        forecast_executor.shutdown()
+
+    @app.on_event("shutdown")
+    async def stop_data_statistics():
+        await data_statistics.stop()
+
+    @app.on_event("shutdown")
+    async def close_database_clients():
+        close_clients()
+
     @app.get("/")
     async def root():
         return {"message": "Prophet Forecasting Service is running", "status": "online"}